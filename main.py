@@ -1,48 +1,217 @@
 from __future__ import annotations
 
 import argparse
-import logging
+import sys
+from typing import Optional
 
-from src import log_conf  # noqa: F401
-from src.corrector import SchemaCorrector
+# catalog_cache зависит только от stdlib; тяжёлые импорты (SQLAlchemy,
+# драйверы БД) откладываются до разбора аргументов, чтобы --help и ошибки
+# валидации CLI не платили за их загрузку.
+from src.catalog_cache import DEFAULT_CACHE_DIR
 
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
 
-def parse_args() -> argparse.Namespace:
+# Флаги со значением для _fast_parse: имя флага -> (атрибут, приведение).
+_VALUE_FLAGS = {
+    '--source-url': ('source_url', str),
+    '--target-url': ('target_url', str),
+    '--max-parallel-schemas': ('max_parallel_schemas', int),
+    '--pool-size': ('pool_size', int),
+    '--lock-timeout': ('lock_timeout', int),
+    '--statement-timeout': ('statement_timeout', int),
+    '--batch-size': ('batch_size', int),
+    '--log-level': ('log_level', str),
+}
+_BOOL_FLAGS = {'--apply': 'apply', '--sync': 'sync'}
+
+
+def _fast_parse(argv: list[str]) -> Optional[argparse.Namespace]:
+    """Разбирает типовой вызов CLI без построения ArgumentParser.
+
+    Понимает те же флаги и значения по умолчанию, что и parse_args(), в
+    формах `--flag value` и `--flag=value`. На всё, что требует сообщения
+    argparse (--help, неизвестный или неполный флаг, неверное значение,
+    отсутствие обязательных URL), возвращает None — тогда вызывающий код
+    откатывается на parse_args(), который и остаётся источником истины.
+
+    Args:
+        argv: Аргументы командной строки без имени программы.
+
+    Returns:
+        Optional[argparse.Namespace]: Результат разбора или None.
+    """
+    values = {
+        'source_url': None,
+        'target_url': None,
+        'schema': None,
+        'max_parallel_schemas': 1,
+        'pool_size': 2,
+        'lock_timeout': 10,
+        'statement_timeout': 0,
+        'batch_size': 100,
+        'apply': False,
+        'cache_dir': None,
+        'sync': False,
+        'log_level': 'INFO',
+    }
+    i = 0
+    n = len(argv)
+    while i < n:
+        flag, eq, value = argv[i].partition('=')
+        i += 1
+
+        if flag in _BOOL_FLAGS and not eq:
+            values[_BOOL_FLAGS[flag]] = True
+            continue
+
+        if flag == '--cache-dir':
+            if not eq and i < n and not argv[i].startswith('-'):
+                value = argv[i]
+                i += 1
+            elif not eq:
+                value = str(DEFAULT_CACHE_DIR)
+            values['cache_dir'] = value
+            continue
+
+        if flag == '--schema' or flag in _VALUE_FLAGS:
+            if not eq:
+                if i >= n or argv[i].startswith('-'):
+                    return None
+                value = argv[i]
+                i += 1
+            if flag == '--schema':
+                values['schema'] = (values['schema'] or []) + [value]
+                continue
+            attr, convert = _VALUE_FLAGS[flag]
+            try:
+                values[attr] = convert(value)
+            except ValueError:
+                return None
+            continue
+
+        return None
+
+    if not values['source_url'] or not values['target_url']:
+        return None
+    if values['log_level'] not in LOG_LEVELS:
+        return None
+    return argparse.Namespace(**values)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description='Synchronize target DB schema by source DB schema',
     )
     parser.add_argument('--source-url', required=True)
     parser.add_argument('--target-url', required=True)
-    parser.add_argument('--schema', default=None)
+    parser.add_argument(
+        '--schema',
+        action='append',
+        default=None,
+        help='Schema to correct (repeat the flag for several schemas)',
+    )
+    parser.add_argument(
+        '--max-parallel-schemas',
+        type=int,
+        default=1,
+        help='How many schemas to correct concurrently',
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=2,
+        help='Connection pool size per database URL',
+    )
     parser.add_argument('--lock-timeout', type=int, default=10)
     parser.add_argument('--statement-timeout', type=int, default=0)
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=100,
+        help='Max statements sent to target in one round-trip (PostgreSQL)',
+    )
     parser.add_argument(
         '--apply',
         action='store_true',
         help='Apply changes (otherwise dry-run)',
     )
+    parser.add_argument(
+        '--cache-dir',
+        nargs='?',
+        const=str(DEFAULT_CACHE_DIR),
+        default=None,
+        help=(
+            'Cache catalog snapshots on disk between runs '
+            f'(default dir: {DEFAULT_CACHE_DIR})'
+        ),
+    )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Introspect source and target sequentially (no threads)',
+    )
     parser.add_argument(
         '--log-level',
         default='INFO',
-        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        choices=LOG_LEVELS,
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
-def main() -> int:
-    args = parse_args()
-    logging.getLogger().setLevel(args.log_level)
+def correct_schema(
+    args: argparse.Namespace,
+    schema: Optional[str],
+    pool_size: int,
+) -> None:
+    from src.catalog_cache import CatalogCache
+    from src.corrector import SchemaCorrector
+    from src.pool import get_engine
 
     corrector = SchemaCorrector(
         source_url=args.source_url,
         target_url=args.target_url,
-        schema=args.schema,
+        schema=schema,
         lock_timeout_seconds=args.lock_timeout,
         statement_timeout_seconds=args.statement_timeout,
+        parallel_introspection=not args.sync,
+        batch_size=args.batch_size,
+        catalog_cache=CatalogCache(args.cache_dir) if args.cache_dir else None,
+        engine_factory=get_engine,
+        pool_size=pool_size,
     )
 
     ops = corrector.diff()
     corrector.apply(ops, dry_run=not args.apply)
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    args = _fast_parse(argv) or parse_args(argv)
+
+    from src import log_conf
+    log_conf.configure(level=args.log_level)
+
+    schemas = args.schema or [None]
+    workers = min(max(1, args.max_parallel_schemas), len(schemas))
+    # Engine и пул общие для всех схем: держим постоянно хотя бы по
+    # соединению на параллельную схему, а всплески сверх этого обслуживает
+    # max_overflow корректора, а не ожидание pool_timeout.
+    pool_size = max(args.pool_size, workers)
+
+    if workers == 1:
+        for schema in schemas:
+            correct_schema(args, schema, pool_size)
+        return 0
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(correct_schema, args, schema, pool_size)
+            for schema in schemas
+        ]
+        for future in as_completed(futures):
+            future.result()
     return 0
 
 
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'correction_db'
+
+
+class CatalogCache:
+    """Дисковый кэш снимков каталога БД между запусками.
+
+    Для каждой пары (url, schema) хранится один файл с последним снимком и
+    токеном версии каталога, при котором снимок был прочитан. Снимок
+    отдаётся только если токен совпадает с текущим, поэтому изменение схемы
+    автоматически делает запись неактуальной.
+
+    Кэш не знает о структуре снимка: он хранит JSON-совместимый словарь
+    (см. CatalogSnapshot.to_dict()). Имя файла — sha256 от url и schema,
+    поэтому пароль из DSN на диск не попадает.
+
+    Args:
+        cache_dir: Каталог для файлов кэша. Если None — используется
+            ~/.cache/correction_db.
+        logger: Логгер. Если не передан — используется логгер по имени класса.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str | Path] = None,
+        *,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """Инициализирует кэш (каталог создаётся при первой записи).
+
+        Args:
+            cache_dir: Каталог для файлов кэша.
+            logger: Логгер для записи сообщений.
+
+        Returns:
+            None.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+    def load(
+        self,
+        url: str,
+        schema: Optional[str],
+        token: str
+    ) -> Optional[dict]:
+        """Возвращает сохранённый снимок, если он соответствует токену.
+
+        Args:
+            url: DSN базы данных.
+            schema: Имя схемы или None.
+            token: Текущий токен версии каталога.
+
+        Returns:
+            Optional[dict]: Снимок или None (нет записи, токен устарел или
+            файл повреждён).
+        """
+        path = self._path(url, schema)
+        try:
+            with path.open(encoding='utf-8') as fh:
+                entry = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            self.logger.warning('Cannot read catalog cache %s: %s', path, exc)
+            return None
+
+        if entry.get('token') != token:
+            return None
+        return entry.get('catalog')
+
+    def store(
+        self,
+        url: str,
+        schema: Optional[str],
+        token: str,
+        catalog: dict
+    ) -> None:
+        """Сохраняет снимок каталога вместе с токеном версии.
+
+        Запись атомарная: файл пишется во временный и затем переименовывается.
+        Ошибки записи (в том числе несериализуемый в JSON снимок) не
+        прерывают работу, а только логируются; временный файл удаляется.
+
+        Args:
+            url: DSN базы данных.
+            schema: Имя схемы или None.
+            token: Токен версии каталога, при котором прочитан снимок.
+            catalog: JSON-совместимый снимок каталога.
+
+        Returns:
+            None.
+        """
+        path = self._path(url, schema)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('w', encoding='utf-8') as fh:
+                json.dump({'token': token, 'catalog': catalog}, fh)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as exc:
+            self.logger.warning('Cannot write catalog cache %s: %s', path, exc)
+        finally:
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def invalidate(
+        self,
+        url: str,
+        schema: Optional[str]
+    ) -> None:
+        """Удаляет сохранённый снимок для (url, schema), если он есть.
+
+        Args:
+            url: DSN базы данных.
+            schema: Имя схемы или None.
+
+        Returns:
+            None.
+        """
+        try:
+            self._path(url, schema).unlink(missing_ok=True)
+        except OSError as exc:
+            self.logger.warning('Cannot invalidate catalog cache: %s', exc)
+
+    def _path(
+        self,
+        url: str,
+        schema: Optional[str]
+    ) -> Path:
+        """Возвращает путь к файлу кэша для (url, schema)."""
+        key = hashlib.sha256(f'{url}|{schema or ""}'.encode()).hexdigest()
+        return self.cache_dir / f'{key}.json'
@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+import hashlib
 import logging
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Iterable, Optional
-
-from sqlalchemy import MetaData, Table, create_engine, text
-from sqlalchemy.engine import Engine
+from collections import defaultdict, deque
+from collections.abc import Collection, Sized
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional
+
+from sqlalchemy import MetaData, Table, create_engine, make_url, text
+from sqlalchemy.engine import Connection, Dialect, Engine, Inspector
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.inspection import inspect
 from sqlalchemy.schema import CreateIndex, CreateTable
 
+if TYPE_CHECKING:
+    from src.catalog_cache import CatalogCache
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Operation:
     """Описывает одну операцию синхронизации схемы.
 
@@ -28,12 +37,544 @@ class Operation:
             - report: отчёт о различиях, которые не применяются автоматически.
         sql: SQL-код операции. Для kind='report' обычно содержит '-- no-op'.
         comment: Человеко-читаемое описание операции.
+
+    Класс объявлен со __slots__: в больших планах операций тысячи, и
+    экземпляры без __dict__ заметно компактнее.
     """
     kind: str
     sql: str
     comment: str = ''
 
 
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Снимок каталога одной БД в рамках выбранной схемы.
+
+    Снимок строится один раз на каждую БД в начале `SchemaCorrector.diff()`
+    (см. `SchemaCorrector._load_catalog()`), после чего планирование работает
+    только с ним и не обращается к БД за колонками, индексами и FK.
+
+    Attributes:
+        tables: Имена таблиц схемы.
+        columns: Словарь вида {table: {column: meta}}, где meta содержит
+            type_sql, nullable и default (см. SchemaCorrector._columns_meta()).
+        indexes: Словарь вида {table: [index]} в формате
+            Inspector.get_indexes() (name, column_names, unique).
+        foreign_keys: Словарь вида {table: [fk]} в формате
+            Inspector.get_foreign_keys().
+    """
+    tables: frozenset[str] = frozenset()
+    columns: dict[str, dict[str, dict]] = field(default_factory=dict)
+    indexes: dict[str, list[dict]] = field(default_factory=dict)
+    foreign_keys: dict[str, list[dict]] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        """Возвращает JSON-совместимое представление снимка.
+
+        dialect_options индексов от Inspector могут содержать выражения
+        SQLAlchemy (например, sqlite_where частичного индекса — TextClause);
+        они сохраняются как SQL-текст. Планированию нужен только сам факт
+        наличия dialect_options: DDL таких индексов строится по Table из
+        source (см. SchemaCorrector._compile_src_index()).
+        """
+        return {
+            'tables': sorted(self.tables),
+            'columns': self.columns,
+            'indexes': {
+                table: [_jsonable_index(info) for info in infos]
+                for table, infos in self.indexes.items()
+            },
+            'foreign_keys': self.foreign_keys,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CatalogSnapshot:
+        """Восстанавливает снимок из результата to_dict()."""
+        return cls(
+            tables=frozenset(data['tables']),
+            columns=data['columns'],
+            indexes=data['indexes'],
+            foreign_keys=data['foreign_keys'],
+        )
+
+
+# Значения dialect_options, которые json.dump() сохраняет как есть.
+_JSON_VALUES = (str, int, float, bool, list, type(None))
+
+
+def _jsonable_index(info: dict) -> dict:
+    """Возвращает описание индекса с dialect_options, пригодными для JSON."""
+    options = info.get('dialect_options')
+    if not options:
+        return info
+    return {
+        **info,
+        'dialect_options': {
+            key: value if isinstance(value, _JSON_VALUES) else str(value)
+            for key, value in options.items()
+        },
+    }
+
+
+# Один запрос к pg_catalog возвращает все таблицы схемы вместе с колонками,
+# индексами и FK (по строке на таблицу, вложенные данные агрегированы в jsonb).
+# :include/:exclude — фильтры таблиц (NULL — без фильтра).
+_PG_CATALOG_SQL = text("""
+WITH rels AS (
+    SELECT c.oid, c.relname, n.nspname
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = COALESCE(CAST(:schema AS text), current_schema())
+      AND c.relkind IN ('r', 'p')
+      AND (CAST(:include AS text[]) IS NULL
+           OR c.relname = ANY(CAST(:include AS text[])))
+      AND NOT c.relname = ANY(COALESCE(CAST(:exclude AS text[]), '{}'))
+),
+cols AS (
+    SELECT a.attrelid AS oid,
+           jsonb_agg(jsonb_build_object(
+               'name', a.attname,
+               'format_type',
+                   pg_catalog.format_type(a.atttypid, a.atttypmod),
+               'collation', (
+                   SELECT co.collname
+                   FROM pg_catalog.pg_collation co
+                   JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+                   WHERE co.oid = a.attcollation
+                     AND a.attcollation <> t.typcollation
+               ),
+               'nullable', NOT a.attnotnull,
+               'default', pg_catalog.pg_get_expr(d.adbin, d.adrelid)
+           ) ORDER BY a.attnum) AS items
+    FROM pg_catalog.pg_attribute a
+    JOIN rels r ON r.oid = a.attrelid
+    LEFT JOIN pg_catalog.pg_attrdef d
+        ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE a.attnum > 0 AND NOT a.attisdropped
+    GROUP BY a.attrelid
+),
+idx AS (
+    SELECT i.indrelid AS oid,
+           jsonb_agg(jsonb_strip_nulls(jsonb_build_object(
+               'name', ic.relname,
+               'unique', i.indisunique,
+               'column_names', (
+                   SELECT jsonb_agg(a.attname ORDER BY k.ord)
+                   FROM unnest(CAST(i.indkey AS int2[]))
+                       WITH ORDINALITY AS k(attnum, ord)
+                   LEFT JOIN pg_catalog.pg_attribute a
+                       ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                   WHERE k.ord <= i.indnkeyatts
+               ),
+               'column_sorting', (
+                   SELECT jsonb_object_agg(a.attname, ARRAY_REMOVE(ARRAY[
+                       CASE WHEN k.opt & 1 = 1 THEN 'desc' END,
+                       CASE k.opt & 3
+                           WHEN 1 THEN 'nulls_last'
+                           WHEN 2 THEN 'nulls_first'
+                       END
+                   ], NULL))
+                   FROM unnest(
+                       CAST(i.indkey AS int2[]),
+                       CAST(i.indoption AS int2[])
+                   ) WITH ORDINALITY AS k(attnum, opt, ord)
+                   JOIN pg_catalog.pg_attribute a
+                       ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                   WHERE k.opt <> 0
+               ),
+               'dialect_options', NULLIF(jsonb_strip_nulls(jsonb_build_object(
+                   'postgresql_using', NULLIF(am.amname, 'btree'),
+                   'postgresql_where',
+                       pg_catalog.pg_get_expr(i.indpred, i.indrelid),
+                   'postgresql_include', (
+                       SELECT jsonb_agg(a.attname ORDER BY k.ord)
+                       FROM unnest(CAST(i.indkey AS int2[]))
+                           WITH ORDINALITY AS k(attnum, ord)
+                       JOIN pg_catalog.pg_attribute a
+                           ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                       WHERE k.ord > i.indnkeyatts
+                   )
+               )), CAST('{}' AS jsonb)),
+               'duplicates_constraint', con.conname
+           )) ORDER BY ic.relname) AS items
+    FROM pg_catalog.pg_index i
+    JOIN rels r ON r.oid = i.indrelid
+    JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_catalog.pg_am am ON am.oid = ic.relam
+    LEFT JOIN pg_catalog.pg_constraint con
+        ON con.conindid = i.indexrelid AND con.contype IN ('u', 'x')
+    WHERE NOT i.indisprimary
+    GROUP BY i.indrelid
+),
+fks AS (
+    SELECT con.conrelid AS oid,
+           jsonb_agg(jsonb_build_object(
+               'name', con.conname,
+               'constrained_columns', (
+                   SELECT jsonb_agg(a.attname ORDER BY k.ord)
+                   FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                   JOIN pg_catalog.pg_attribute a
+                       ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+               ),
+               'referred_schema', CASE
+                   WHEN CAST(:schema AS text) IS NULL
+                        AND rn.nspname = current_schema() THEN NULL
+                   ELSE rn.nspname
+               END,
+               'referred_table', rc.relname,
+               'referred_columns', (
+                   SELECT jsonb_agg(a.attname ORDER BY k.ord)
+                   FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                   JOIN pg_catalog.pg_attribute a
+                       ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+               ),
+               'options', jsonb_strip_nulls(jsonb_build_object(
+                   'ondelete', CASE con.confdeltype
+                       WHEN 'r' THEN 'RESTRICT'
+                       WHEN 'c' THEN 'CASCADE'
+                       WHEN 'n' THEN 'SET NULL'
+                       WHEN 'd' THEN 'SET DEFAULT'
+                   END,
+                   'onupdate', CASE con.confupdtype
+                       WHEN 'r' THEN 'RESTRICT'
+                       WHEN 'c' THEN 'CASCADE'
+                       WHEN 'n' THEN 'SET NULL'
+                       WHEN 'd' THEN 'SET DEFAULT'
+                   END
+               ))
+           ) ORDER BY con.conname) AS items
+    FROM pg_catalog.pg_constraint con
+    JOIN rels r ON r.oid = con.conrelid
+    JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+    JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+    WHERE con.contype = 'f'
+    GROUP BY con.conrelid
+)
+SELECT r.relname AS table_name,
+       COALESCE(cols.items, CAST('[]' AS jsonb)) AS columns,
+       COALESCE(idx.items, CAST('[]' AS jsonb)) AS indexes,
+       COALESCE(fks.items, CAST('[]' AS jsonb)) AS foreign_keys
+FROM rels r
+LEFT JOIN cols ON cols.oid = r.oid
+LEFT JOIN idx ON idx.oid = r.oid
+LEFT JOIN fks ON fks.oid = r.oid
+ORDER BY r.relname
+""")
+
+# Готовый SQL без bind-параметров: драйвер получает строку как есть.
+_RAW_SQL_OPTIONS = {'no_parameters': True}
+
+# Savepoint, которым _execute_batch() оборачивает multi-statement батч на
+# PostgreSQL, чтобы после ошибки повторить батч по одной операции.
+_BATCH_SAVEPOINT = 'correction_db_batch'
+
+# SQLSTATE ошибок батча, после которых операции не повторяются по одной:
+# повтор снова ждал бы те же блокировки и таймауты. 55P03 — lock_timeout,
+# 57014 — statement_timeout (query_canceled), 40P01 — deadlock, 40001 —
+# serialization_failure.
+_NO_RETRY_SQLSTATES = frozenset({'55P03', '57014', '40P01', '40001'})
+
+# Версия формата снимка каталога в catalog_cache. Входит в токен версии
+# каталога, поэтому снимки, сохранённые в старом формате, не используются.
+_SNAPSHOT_FORMAT = 2
+
+# Операции, которые apply() выполняет отдельно от батчей: построение индекса
+# может идти долго, и по логу должно быть видно, на каком индексе идёт работа.
+_UNBATCHED_KINDS = frozenset({'create_index'})
+
+# Префикс ключа advisory-блокировки схемы в apply().
+SCHEMA_LOCK_PREFIX = 'correction_db:'
+
+_PG_SCHEMA_LOCK_SQL = text(
+    'SELECT pg_advisory_xact_lock(hashtext('
+    'CAST(:prefix AS text) '
+    '|| COALESCE(CAST(:schema AS text), current_schema())))'
+)
+
+# Дешёвый токен версии каталога схемы: xmin меняется у строк pg_class,
+# pg_attribute и pg_constraint при любом изменении таблиц, колонок, индексов
+# и ограничений, поэтому хэш от них совпадает, только пока схема не менялась.
+_PG_CATALOG_VERSION_SQL = text("""
+WITH ns AS (
+    SELECT oid
+    FROM pg_catalog.pg_namespace
+    WHERE nspname = COALESCE(CAST(:schema AS text), current_schema())
+)
+SELECT md5(COALESCE(string_agg(v, ',' ORDER BY v), ''))
+FROM (
+    SELECT 'c' || c.oid || ':' || CAST(c.xmin AS text) AS v
+    FROM pg_catalog.pg_class c
+    JOIN ns ON ns.oid = c.relnamespace
+    UNION ALL
+    SELECT 'a' || a.attrelid || '.' || a.attnum || ':'
+           || CAST(a.xmin AS text)
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+    JOIN ns ON ns.oid = c.relnamespace
+    WHERE a.attnum > 0
+    UNION ALL
+    SELECT 'k' || con.oid || ':' || CAST(con.xmin AS text)
+    FROM pg_catalog.pg_constraint con
+    JOIN ns ON ns.oid = con.connamespace
+) AS versions
+""")
+
+# Отпечаток содержимого схемы: в отличие от токена версии не зависит от oid и
+# xmin, поэтому совпадает у двух разных БД с одинаковыми таблицами, колонками
+# (тип, нестандартная collation, NOT NULL), индексами и FK. Это всё, что diff()
+# сравнивает у таблиц из обеих схем (collation входит в type_sql, см.
+# _pg_type_sql()); DEFAULT колонок не сравнивается. Поэтому равенство
+# отпечатков означает пустой план.
+_PG_SCHEMA_FINGERPRINT_SQL = text("""
+WITH rels AS (
+    SELECT c.oid, c.relname
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = COALESCE(CAST(:schema AS text), current_schema())
+      AND c.relkind IN ('r', 'p')
+      AND (CAST(:include AS text[]) IS NULL
+           OR c.relname = ANY(CAST(:include AS text[])))
+      AND NOT c.relname = ANY(COALESCE(CAST(:exclude AS text[]), '{}'))
+)
+SELECT md5(COALESCE(string_agg(item, E'\\n' ORDER BY item), ''))
+FROM (
+    SELECT 't ' || r.relname AS item
+    FROM rels r
+    UNION ALL
+    SELECT 'c ' || r.relname || '.' || a.attname || ' '
+           || pg_catalog.format_type(a.atttypid, a.atttypmod)
+           || COALESCE(' collate ' || co.collname, '')
+           || CASE WHEN a.attnotnull THEN ' not null' ELSE '' END
+    FROM pg_catalog.pg_attribute a
+    JOIN rels r ON r.oid = a.attrelid
+    JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_catalog.pg_collation co
+        ON co.oid = a.attcollation AND a.attcollation <> t.typcollation
+    WHERE a.attnum > 0 AND NOT a.attisdropped
+    UNION ALL
+    SELECT 'i ' || pg_catalog.pg_get_indexdef(i.indexrelid)
+    FROM pg_catalog.pg_index i
+    JOIN rels r ON r.oid = i.indrelid
+    UNION ALL
+    SELECT 'f ' || r.relname || '.' || con.conname || ' '
+           || pg_catalog.pg_get_constraintdef(con.oid)
+    FROM pg_catalog.pg_constraint con
+    JOIN rels r ON r.oid = con.conrelid
+    WHERE con.contype = 'f'
+) AS items
+""")
+
+
+def pg_catalog_version(
+    conn: Connection,
+    schema: Optional[str] = None
+) -> str:
+    """Возвращает токен версии каталога схемы PostgreSQL.
+
+    Токен — md5 от xmin строк pg_class/pg_attribute/pg_constraint схемы
+    (_PG_CATALOG_VERSION_SQL) и меняется при любом DDL в ней (а также при
+    TRUNCATE). По нему SchemaCorrector проверяет актуальность кэша
+    каталога.
+
+    Args:
+        conn: Соединение с PostgreSQL.
+        schema: Имя схемы; None — current_schema().
+
+    Returns:
+        str: Токен версии каталога.
+    """
+    return conn.execute(
+        _PG_CATALOG_VERSION_SQL,
+        {'schema': schema},
+    ).scalar()
+
+
+def _pool_options_for(
+    url: str,
+    options: dict
+) -> dict:
+    """Возвращает настройки пула, применимые к Engine для url.
+
+    SQLite в памяти работает через SingletonThreadPool/StaticPool, которые
+    не принимают pool_size/max_overflow, поэтому для него остаются только
+    pool_pre_ping и pool_recycle.
+
+    Args:
+        url: DSN базы данных.
+        options: Полный набор настроек пула.
+
+    Returns:
+        dict: Аргументы для create_engine().
+    """
+    parsed = make_url(url)
+    if (
+        parsed.get_backend_name() == 'sqlite'
+        and parsed.database in (None, '', ':memory:')
+    ):
+        return {
+            k: v for k, v in options.items()
+            if k not in ('pool_size', 'max_overflow')
+        }
+    return options
+
+
+def _pg_type_sql(
+    dialect: Dialect,
+    format_type: str,
+    collation: Optional[str]
+) -> str:
+    """Приводит format_type() PostgreSQL к записи компилятора типов.
+
+    Inspector отдаёт типы объектами SQLAlchemy, а _columns_meta() компилирует
+    их диалектом ('VARCHAR(255)', 'TIMESTAMP WITHOUT TIME ZONE'). Снимок из
+    pg_catalog должен давать те же строки, иначе сравнение с каталогом,
+    прочитанным через Inspector (другая СУБД, кэш), видит ложные расхождения
+    типов. Разбор format_type() — тот же, что у Inspector PostgreSQL: через
+    внутренние помощники PGDialect, поэтому версия SQLAlchemy закреплена в
+    requirements.txt, а разбор покрыт unit-тестом без PostgreSQL.
+
+    Args:
+        dialect: Диалект PostgreSQL соединения.
+        format_type: Результат pg_catalog.format_type().
+        collation: Нестандартная collation колонки или None.
+
+    Returns:
+        str: SQL-представление типа. ENUM и DOMAIN компилируются в своё имя,
+        поэтому для них format_type() возвращается как есть.
+    """
+    base = dialect._format_type_args_pattern.sub('', format_type)
+    base = dialect._format_array_spec_pattern.sub('', base)
+    if base.lower() not in dialect.ischema_names and not (
+        base.startswith('interval ')
+    ):
+        return format_type
+    coltype = dialect._reflect_type(
+        format_type,
+        {},
+        {},
+        type_description=format_type,
+        collation=collation,
+    )
+    return str(coltype.compile(dialect=dialect))
+
+
+def _sqlstate(exc: DBAPIError) -> Optional[str]:
+    """Возвращает SQLSTATE ошибки драйвера (psycopg2 или psycopg 3)."""
+    orig = exc.orig
+    return getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+
+
+def _partition_names(
+    src_names: Iterable[str],
+    tgt_names: Iterable[str]
+) -> tuple[list[str], list[str], list[str]]:
+    """Делит имена на отсутствующие, лишние и общие за один проход.
+
+    Оба набора сортируются один раз, дальше — слияние двумя указателями,
+    так что все три списка получаются уже отсортированными, без отдельных
+    разностей множеств и сортировок каждого результата.
+
+    Args:
+        src_names: Имена в source.
+        tgt_names: Имена в target.
+
+    Returns:
+        tuple[list[str], list[str], list[str]]: (только в source,
+        только в target, в обеих), каждый список отсортирован.
+    """
+    src_sorted = sorted(src_names)
+    tgt_sorted = sorted(tgt_names)
+    missing: list[str] = []
+    extra: list[str] = []
+    common: list[str] = []
+
+    i = j = 0
+    n_src, n_tgt = len(src_sorted), len(tgt_sorted)
+    while i < n_src and j < n_tgt:
+        a, b = src_sorted[i], tgt_sorted[j]
+        if a == b:
+            common.append(a)
+            i += 1
+            j += 1
+        elif a < b:
+            missing.append(a)
+            i += 1
+        else:
+            extra.append(b)
+            j += 1
+    missing.extend(src_sorted[i:])
+    extra.extend(tgt_sorted[j:])
+    return missing, extra, common
+
+
+def _fk_components(
+    nodes: list[str],
+    deps: dict[str, set[str]]
+) -> list[list[str]]:
+    """Разбивает граф FK на компоненты сильной связности (Тарьян).
+
+    Обход итеративный, без рекурсии, поэтому длинные цепочки FK не упираются
+    в лимит стека. Компоненты возвращаются в порядке создания: компонента
+    «родителей» всегда раньше компоненты, которая на них ссылается.
+
+    Args:
+        nodes: Таблицы в исходном порядке.
+        deps: Родители каждой таблицы ({table: {referred_table}}); рёбра
+            на таблицы вне nodes игнорируются.
+
+    Returns:
+        list[list[str]]: Компоненты; внутри компоненты таблицы идут в
+        порядке nodes.
+    """
+    position = {t: i for i, t in enumerate(nodes)}
+    index: dict[str, int] = {}
+    low: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    components: list[list[str]] = []
+
+    def edges(t: str) -> Iterator[str]:
+        return iter(sorted(
+            (p for p in deps.get(t, ()) if p in position),
+            key=position.__getitem__,
+        ))
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, edges(root))]
+        while work:
+            node, it = work[-1]
+            for nxt in it:
+                if nxt not in index:
+                    index[nxt] = low[nxt] = len(index)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, edges(nxt)))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component: list[str] = []
+                    while True:
+                        t = stack.pop()
+                        on_stack.discard(t)
+                        component.append(t)
+                        if t == node:
+                            break
+                    component.sort(key=position.__getitem__)
+                    components.append(component)
+    return components
+
+
 class SchemaCorrector:
     """Сравнивает две базы и подтягивает схему целевой базы к эталонной.
 
@@ -55,7 +596,35 @@ class SchemaCorrector:
         allow_destructive: Флаг потенциально деструктивных операций. В текущей
             реализации используется как настройка, но деструктивные операции
             автоматически не выполняются.
+        parallel_introspection: Если True — каталоги source и target
+            читаются параллельно (в двух потоках), иначе последовательно.
+        batch_size: Максимальное число SQL-операций, отправляемых в target
+            одним запросом при apply(). Батчинг используется только для
+            PostgreSQL; значение 1 отключает его.
+        catalog_cache: Дисковый кэш снимков каталога (CatalogCache). Если
+            None — каталог всегда читается из БД.
+        fast_equal_skip: Если True — diff() сначала сравнивает дешёвые
+            отпечатки схем (см. _schema_fingerprint()) и при совпадении
+            сразу возвращает пустой план, не читая каталоги целиком.
+        include_tables: Если задан — сравниваются только эти таблицы.
+        exclude_tables: Таблицы, которые не сравниваются вовсе. Оба фильтра
+            применяются до чтения колонок, индексов и FK, поэтому
+            отброшенные таблицы не стоят ничего.
+        engine_factory: Фабрика Engine: вызывается как
+            engine_factory(url, **pool_options). По умолчанию create_engine;
+            для переиспользования пулов между запусками можно передать
+            pool.get_engine.
+        pool_size: Размер пула соединений каждого Engine.
+        max_overflow: Сколько соединений сверх pool_size можно открыть
+            (по умолчанию 10, как в SQLAlchemy). Нулевое значение жёстко
+            ограничивает пул: общий Engine нескольких корректоров (см.
+            pool.get_engine) тогда должен быть рассчитан на их пик.
+        pool_pre_ping: Проверять соединение перед выдачей из пула.
+        pool_recycle: Пересоздавать соединения старше N секунд (-1 — никогда).
         logger: Логгер. Если не передан — используется логгер по имени класса.
+
+    Source только читается, поэтому его соединения работают в AUTOCOMMIT:
+    запросы каталога не оборачиваются в BEGIN/ROLLBACK.
     """
 
     def __init__(
@@ -67,9 +636,20 @@ class SchemaCorrector:
         lock_timeout_seconds: int = 10,
         statement_timeout_seconds: int = 0,
         allow_destructive: bool = False,
+        parallel_introspection: bool = True,
+        batch_size: int = 100,
+        catalog_cache: Optional[CatalogCache] = None,
+        fast_equal_skip: bool = True,
+        include_tables: Optional[Collection[str]] = None,
+        exclude_tables: Optional[Collection[str]] = None,
+        engine_factory: Optional[Callable[..., Engine]] = None,
+        pool_size: int = 2,
+        max_overflow: int = 10,
+        pool_pre_ping: bool = True,
+        pool_recycle: int = -1,
         logger: Optional[logging.Logger] = None,
     ) -> None:
-        """Инициализирует корректор схемы и создаёт подключения к БД.
+        """Инициализирует корректор схемы (Engine создаются лениво).
 
         Args:
             source_url: DSN эталонной БД (БД №1).
@@ -78,32 +658,183 @@ class SchemaCorrector:
             lock_timeout_seconds: Таймаут ожидания блокировок (секунды).
             statement_timeout_seconds: Таймаут выполнения запросов (секунды).
             allow_destructive: Флаг разрешения деструктивных операций.
+            parallel_introspection: Читать каталоги source и target
+                параллельно.
+            batch_size: Размер батча SQL-операций при apply().
+            catalog_cache: Дисковый кэш снимков каталога.
+            fast_equal_skip: Пропускать diff() при равных отпечатках схем.
+            include_tables: Сравнивать только эти таблицы.
+            exclude_tables: Не сравнивать эти таблицы.
+            engine_factory: Фабрика Engine по DSN и настройкам пула.
+            pool_size: Размер пула соединений каждого Engine.
+            max_overflow: Соединения сверх pool_size.
+            pool_pre_ping: Проверять соединение перед выдачей из пула.
+            pool_recycle: Время жизни соединения в секундах (-1 — без лимита).
             logger: Логгер для записи сообщений.
 
         Returns:
             None.
         """
-        self.source_engine = create_engine(source_url)
-        self.target_engine = create_engine(target_url)
+        # Engine создаются при первом обращении (см. source_engine и
+        # target_engine): корректору, который не ходит в БД, пулы не нужны.
+        self._source_url = source_url
+        self._target_url = target_url
+        self._make_engine = engine_factory or create_engine
+        self._pool_options = {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_pre_ping': pool_pre_ping,
+            'pool_recycle': pool_recycle,
+        }
         self.schema = schema
         self.lock_timeout_seconds = lock_timeout_seconds
         self.statement_timeout_seconds = statement_timeout_seconds
         self.allow_destructive = allow_destructive
+        self.parallel_introspection = parallel_introspection
+        self.batch_size = max(1, batch_size)
+        self.catalog_cache = catalog_cache
+        self.fast_equal_skip = fast_equal_skip
+        self.include_tables = (
+            frozenset(include_tables) if include_tables is not None else None
+        )
+        self.exclude_tables = frozenset(exclude_tables or ())
         self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._src_insp: Optional[Inspector] = None
+        self._tgt_insp: Optional[Inspector] = None
+        self._src_md: Optional[MetaData] = None
+        self._src_conn: Optional[Connection] = None
+        self._tgt_conn: Optional[Connection] = None
+        # Состояние target, по которому построен последний план (только
+        # PostgreSQL): отпечаток из fast_equal_skip либо снимок каталога.
+        # apply() сверяет его под блокировкой схемы.
+        self._planned_fingerprint: Optional[str] = None
+        self._planned_catalog: Optional[CatalogSnapshot] = None
 
         self.logger.info(
             'SchemaCorrector initialized '
             '(schema=%s, lock_timeout=%ss, '
-            'statement_timeout=%ss, allow_destructive=%s)',
+            'statement_timeout=%ss, allow_destructive=%s, '
+            'parallel_introspection=%s, batch_size=%d)',
             self.schema,
             self.lock_timeout_seconds,
             self.statement_timeout_seconds,
             self.allow_destructive,
+            self.parallel_introspection,
+            self.batch_size,
+        )
+
+    @cached_property
+    def source_engine(self) -> Engine:
+        """Engine эталонной БД, создаётся при первом обращении.
+
+        Source только читается, поэтому соединения работают в AUTOCOMMIT;
+        execution_options() возвращает Engine поверх того же пула.
+
+        Returns:
+            Engine: Engine source.
+        """
+        return self._make_engine(
+            self._source_url,
+            **_pool_options_for(self._source_url, self._pool_options),
+        ).execution_options(isolation_level='AUTOCOMMIT')
+
+    @cached_property
+    def target_engine(self) -> Engine:
+        """Engine целевой БД, создаётся при первом обращении.
+
+        Returns:
+            Engine: Engine target.
+        """
+        return self._make_engine(
+            self._target_url,
+            **_pool_options_for(self._target_url, self._pool_options),
         )
 
+    @cached_property
+    def _ddl_dialect(self) -> Dialect:
+        """Диалект target: DDL компилируется прямо под него.
+
+        Диалект не меняется за время жизни engine, поэтому Engine в
+        compile() не передаётся.
+        """
+        return self.target_engine.dialect
+
+    @cached_property
+    def _target_dialect(self) -> str:
+        """Имя диалекта target ('postgresql', 'sqlite', ...)."""
+        return self._ddl_dialect.name
+
+    @cached_property
+    def _quote(self) -> Callable[[str], str]:
+        """Квотирование идентификатора под диалект target.
+
+        Вызывается на каждый идентификатор в DDL, а имена таблиц и колонок
+        повторяются из операции в операцию, поэтому результат кэшируется
+        (попадание в кэш примерно вчетверо дешевле экранирования заново).
+        """
+        return lru_cache(maxsize=2048)(
+            self._ddl_dialect.identifier_preparer.quote_identifier
+        )
+
+    @cached_property
+    def _schema_prefix(self) -> str:
+        """Квотированный префикс схемы ('"schema".') или пустая строка."""
+        return f'{self._quote(self.schema)}.' if self.schema else ''
+
+    def __enter__(self) -> SchemaCorrector:
+        """Закрепляет по одному соединению за source и target.
+
+        Внутри with diff() и apply() (а также Inspector) работают через эти
+        соединения и не берут новые из пула на каждый шаг. Соединение
+        source на PostgreSQL дополнительно переводится в read-only.
+
+        Без with всё работает как раньше — через соединения из пула.
+
+        Returns:
+            SchemaCorrector: Сам корректор.
+        """
+        self._src_conn = self.source_engine.connect()
+        self._tgt_conn = self.target_engine.connect()
+        if self._src_conn.dialect.name == 'postgresql':
+            self._src_conn.exec_driver_sql(
+                'SET default_transaction_read_only = on'
+            )
+        # Закэшированные Inspector привязаны к engine, а не к соединениям.
+        self._src_insp = None
+        self._tgt_insp = None
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Возвращает закреплённые соединения в пул.
+
+        Returns:
+            None.
+        """
+        src_conn, tgt_conn = self._src_conn, self._tgt_conn
+        self._src_conn = None
+        self._tgt_conn = None
+        self._src_insp = None
+        self._tgt_insp = None
+        try:
+            if src_conn.dialect.name == 'postgresql':
+                src_conn.exec_driver_sql('RESET default_transaction_read_only')
+        finally:
+            src_conn.close()
+            tgt_conn.close()
+
     def diff(self) -> list[Operation]:
         """Строит план синхронизации схемы целевой БД по эталону.
 
+        Обёртка над iter_diff(), собирающая план в список.
+
+        Returns:
+            list[Operation]: Список операций для синхронизации (план).
+        """
+        return list(self.iter_diff())
+
+    def iter_diff(self) -> Iterator[Operation]:
+        """Лениво строит план синхронизации схемы целевой БД по эталону.
+
         - создание отсутствующих таблиц;
         - добавление отсутствующих колонок;
         - создание отсутствующих индексов;
@@ -114,43 +845,66 @@ class SchemaCorrector:
             не применяются автоматически и возвращаются как
             Operation(kind='report').
 
-        Returns:
-            list[Operation]: Список операций для синхронизации (план).
+        При fast_equal_skip=True сначала сравниваются отпечатки схем (один
+        короткий запрос на БД); если они равны, план пуст и каталоги не
+        читаются. Иначе каталог каждой БД читается один раз (см.
+        _load_catalogs()), дальше планирование работает только со снимками.
+        Кэш reflection сбрасывается в начале каждого вызова, чтобы повторный
+        diff() видел актуальную схему.
+
+        Операции отдаются по мере планирования (например, для вывода плана
+        без сборки списка). Порядок тот же, что у diff(); apply() принимает
+        и такой поток, но собирает его до открытия транзакции.
+
+        Yields:
+            Operation: Очередная операция плана.
         """
         self.logger.info('Starting schema diff...')
-        src_inspector = inspect(self.source_engine)
-        tgt_inspector = inspect(self.target_engine)
+        self.clear_reflection_cache()
+        self._planned_fingerprint = None
+        self._planned_catalog = None
 
-        src_tables = set(src_inspector.get_table_names(
-            schema=self.schema
-        ))
-        tgt_tables = set(tgt_inspector.get_table_names(
-            schema=self.schema
-        ))
+        if self.fast_equal_skip and self._schemas_fingerprint_equal():
+            self.logger.info(
+                'Schemas are fingerprint-equal. Diff done. Planned ops=0'
+            )
+            return
+
+        src_catalog, tgt_catalog = self._load_catalogs()
+        self._planned_catalog = tgt_catalog
+
+        missing_tables, extra_tables, common_tables = _partition_names(
+            src_catalog.tables,
+            tgt_catalog.tables,
+        )
 
         self.logger.info(
             'Introspected tables: source=%d, target=%d',
-            len(src_tables),
-            len(tgt_tables),
+            len(src_catalog.tables),
+            len(tgt_catalog.tables),
         )
 
-        ops: list[Operation] = []
+        # Table source нужны только новым таблицам (CREATE TABLE). Отражаем
+        # их одним вызовом: MetaData.reflect() читает каталог батчами
+        # (get_multi_*), а не отдельными запросами на каждую таблицу.
+        self._reflect_src_tables(missing_tables)
+
+        planned = 0
 
-        extra_tables = sorted(tgt_tables - src_tables)
         for table_name in extra_tables:
-            msg = f'EXTRA: table exists only in target: {table_name}'
-            self.logger.warning(msg)
-            ops.append(
-                Operation(
-                    kind='report',
-                    sql='-- no-op',
-                    comment=msg
-                )
+            self.logger.warning(
+                'EXTRA: table exists only in target: %s',
+                table_name,
+            )
+            planned += 1
+            yield Operation(
+                kind='report',
+                sql='-- no-op',
+                comment=f'EXTRA: table exists only in target: {table_name}'
             )
 
-        missing_tables = sorted(src_tables - tgt_tables)
         missing_tables = self._sort_missing_tables_by_fk(
-            src_inspector,
+            src_catalog.foreign_keys,
             missing_tables
         )
         if missing_tables:
@@ -158,83 +912,123 @@ class SchemaCorrector:
                 'Missing tables in target: %d',
                 len(missing_tables)
             )
+        include_fk = self._is_sqlite()
         for table_name in missing_tables:
             self.logger.info('Planning create table: %s', table_name)
-            include_fk = self._is_sqlite()
 
-            ops.extend(
-                self._plan_create_table(
-                    table_name,
-                    include_foreign_keys=include_fk,
-                )
-            )
+            for op in self._plan_create_table(
+                self._src_table(table_name),
+                include_foreign_keys=include_fk,
+            ):
+                planned += 1
+                yield op
+
+            # Индексы UNIQUE-ограничений создаёт сам CREATE TABLE; если
+            # других индексов нет, планировать нечего.
+            new_table_indexes = [
+                i for i in src_catalog.indexes.get(table_name, [])
+                if not i.get('duplicates_constraint')
+            ]
+            if not new_table_indexes:
+                continue
 
-            idx_ops = self._plan_add_missing_indexes(table_name)
+            idx_ops = self._plan_add_missing_indexes(
+                table_name,
+                src_indexes=new_table_indexes,
+                tgt_indexes=[],
+            )
             if idx_ops:
                 self.logger.info(
                     'Planning add indexes for new table: table=%s, count=%d',
                     table_name,
                     len(idx_ops),
                 )
-            ops.extend(idx_ops)
+            planned += len(idx_ops)
+            yield from idx_ops
 
-        common_tables = sorted(src_tables & tgt_tables)
         self.logger.info('Common tables: %d', len(common_tables))
 
+        # Один проход по общим таблицам: колонки и индексы таблицы
+        # планируются вместе, пока её данные из снимков «под рукой».
+        # Колонки идут раньше индексов той же таблицы, поэтому индекс по
+        # новой колонке создаётся уже после неё.
+        risky_reports: list[Operation] = []
         for table_name in common_tables:
-            extra_col_reports = self._report_extra_columns(table_name)
-            for r in extra_col_reports:
-                self.logger.warning(r.comment)
-            ops.extend(extra_col_reports)
-
-            add_col_ops = self._plan_add_missing_columns(table_name)
-            if add_col_ops:
-                self.logger.info(
-                    'Planning add columns: table=%s, count=%d',
-                    table_name,
-                    len(add_col_ops),
+            src_cols = src_catalog.columns.get(table_name, {})
+            tgt_cols = tgt_catalog.columns.get(table_name, {})
+            # В установившемся режиме колонки почти всех таблиц совпадают:
+            # сравнение словарей целиком (C-уровень, до первого различия)
+            # дешевле поколоночного разбора в _plan_column_changes().
+            if src_cols != tgt_cols:
+                add_col_ops, extra_col_reports, risky = (
+                    self._plan_column_changes(table_name, src_cols, tgt_cols)
                 )
-            ops.extend(add_col_ops)
+                risky_reports.extend(risky)
 
-        for table_name in common_tables:
-            idx_ops = self._plan_add_missing_indexes(table_name)
+                for r in extra_col_reports:
+                    self.logger.warning(r.comment)
+                planned += len(extra_col_reports)
+                yield from extra_col_reports
+
+                if add_col_ops:
+                    self.logger.info(
+                        'Planning add columns: table=%s, count=%d',
+                        table_name,
+                        len(add_col_ops),
+                    )
+                planned += len(add_col_ops)
+                yield from add_col_ops
+
+            src_indexes = src_catalog.indexes.get(table_name)
+            if not src_indexes:
+                continue
+            idx_ops = self._plan_add_missing_indexes(
+                table_name,
+                src_indexes=src_indexes,
+                tgt_indexes=tgt_catalog.indexes.get(table_name, []),
+            )
             if idx_ops:
                 self.logger.info(
                     'Planning add indexes: table=%s, count=%d',
                     table_name,
                     len(idx_ops),
                 )
-            ops.extend(idx_ops)
+            planned += len(idx_ops)
+            yield from idx_ops
 
-        fk_ops: list[Operation] = []
+        fk_count = 0
         if not self._is_sqlite():
             for table_name in missing_tables:
-                fk_ops.extend(self._plan_add_foreign_keys_for_new_table(
-                    src_inspector,
+                fk_ops = self._plan_add_foreign_keys_for_new_table(
                     table_name,
-                ))
+                    src_catalog.foreign_keys.get(table_name, []),
+                )
+                fk_count += len(fk_ops)
+                yield from fk_ops
 
         for table_name in common_tables:
-            fk_ops.extend(self._plan_add_missing_foreign_keys(table_name))
+            fk_ops = self._plan_add_missing_foreign_keys(
+                table_name,
+                src_catalog.foreign_keys.get(table_name, []),
+                tgt_catalog.foreign_keys.get(table_name, []),
+            )
+            fk_count += len(fk_ops)
+            yield from fk_ops
 
-        if fk_ops:
-            self.logger.info('Planned foreign keys: %d', len(fk_ops))
-        ops.extend(fk_ops)
+        if fk_count:
+            self.logger.info('Planned foreign keys: %d', fk_count)
+        planned += fk_count
 
-        risky_count = 0
-        for table_name in common_tables:
-            reports = self._report_risky_differences(table_name)
-            for r in reports:
-                self.logger.warning(r.comment)
-            risky_count += len(reports)
-            ops.extend(reports)
+        for r in risky_reports:
+            self.logger.warning(r.comment)
+        planned += len(risky_reports)
+        yield from risky_reports
 
         self.logger.info(
             'Diff done. Planned ops=%d (risky reports=%d)',
-            len(ops),
-            risky_count,
+            planned,
+            len(risky_reports),
         )
-        return ops
 
     def apply(
         self,
@@ -246,120 +1040,808 @@ class SchemaCorrector:
 
         По умолчанию работает в режиме dry-run: не выполняет SQL, а печатает
         операции. В режиме исполнения выполняет SQL внутри транзакции.
+        Подряд идущие операции отправляются батчами до batch_size штук
+        (см. _execute_batch()); create_index выполняется отдельным запросом
+        между батчами. Для PostgreSQL транзакция сначала берёт
+        advisory-блокировку схемы (см. _acquire_schema_lock()).
+
+        Операции validate_foreign_key откладываются и выполняются батчами
+        во второй транзакции, после фиксации основной. Если валидация
+        упадёт, FK останутся в target в состоянии NOT VALID.
 
         Операции kind='report' пропускаются.
 
+        План строится без блокировки, поэтому на PostgreSQL под блокировкой
+        отпечаток target сверяется с отпечатком на момент планирования (см.
+        _check_plan_is_current()): если другой запуск успел изменить схему,
+        устаревший план не применяется.
+
+        Поток операций (например, iter_diff()) сначала собирается в список,
+        и только потом открывается транзакция: планирование читает target
+        через свои соединения пула, и при ограниченном пуле (pool_size,
+        max_overflow) apply(), держащий соединение в транзакции, ждал бы их
+        до таймаута.
+
         Args:
             ops: Последовательность операций для применения.
             dry_run: Если True — только выводит SQL и не применяет изменения.
 
         Raises:
+            RuntimeError: Схема target изменилась после построения плана.
             Exception: Любая ошибка выполнения SQL пробрасывается наружу
                 после логирования на уровнях error/critical.
 
         Returns:
             None.
         """
-        ops_list = list(ops)
+        if not isinstance(ops, Sized):
+            ops = list(ops)
+        total = len(ops)
+        op_msg = f'Executing op %d/{total}: %s (%s)'
         self.logger.info(
             'Apply called. dry_run=%s, ops=%d',
             dry_run,
-            len(ops_list)
+            total
+        )
+
+        if dry_run:
+            for op in ops:
+                print(f'-- {op.kind}: {op.comment}\n{op.sql}\n')
+            self.logger.info('Dry-run finished. No changes applied.')
+            return
+
+        try:
+            with self._connect(self.target_engine) as conn, conn.begin():
+                self._apply_timeouts(conn)
+                self._acquire_schema_lock(conn)
+                self._check_plan_is_current(conn)
+                batch: list[str] = []
+                deferred: list[str] = []
+                i = 0
+                for i, op in enumerate(ops, start=1):
+                    self.logger.info(op_msg, i, op.kind, op.comment)
+                    if op.kind == 'report':
+                        self.logger.info('Skipping report op: %s', op.comment)
+                        continue
+                    if op.kind == 'validate_foreign_key':
+                        deferred.append(op.sql)
+                        continue
+                    if op.kind in _UNBATCHED_KINDS:
+                        self._execute_batch(conn, batch)
+                        batch = []
+                        self._execute_batch(conn, [op.sql])
+                        continue
+                    batch.append(op.sql)
+                    if len(batch) >= self.batch_size:
+                        self._execute_batch(conn, batch)
+                        batch = []
+                self._execute_batch(conn, batch)
+            if deferred:
+                self.logger.info('Validating foreign keys: %d', len(deferred))
+                with self._connect(self.target_engine) as conn, conn.begin():
+                    self._apply_timeouts(conn)
+                    self._acquire_schema_lock(conn)
+                    for start in range(0, len(deferred), self.batch_size):
+                        self._execute_batch(
+                            conn,
+                            deferred[start:start + self.batch_size],
+                        )
+            self._planned_fingerprint = None
+            self._planned_catalog = None
+            self.clear_reflection_cache()
+            if self.catalog_cache is not None:
+                self.catalog_cache.invalidate(
+                    self._engine_key(self.target_engine),
+                    self.schema,
+                )
+            self.logger.info('Apply finished successfully. ops=%d', i)
+        except Exception as exc:
+            self.logger.error('Apply failed: %s', exc, exc_info=True)
+            self.logger.critical('Schema correction aborted due to error.')
+            raise
+
+    def clear_reflection_cache(self) -> None:
+        """Сбрасывает результаты reflection и отражённые таблицы source.
+
+        Inspector хранит результаты reflection в своём info_cache, а
+        _src_md — уже отражённые Table; после изменения схемы (или перед
+        новым diff()) их нужно выбросить. Сами Inspector при этом
+        остаются: inspect(engine) при создании берёт соединение из пула,
+        а очистка info_cache даёт тот же эффект без лишнего checkout.
+
+        Returns:
+            None.
+        """
+        for insp in (self._src_insp, self._tgt_insp):
+            if insp is not None:
+                insp.clear_cache()
+        self._src_md = None
+
+    @property
+    def _src_inspector(self) -> Inspector:
+        """Inspector source, общий для всех reflection-вызовов."""
+        if self._src_insp is None:
+            self._src_insp = inspect(self._src_conn or self.source_engine)
+        return self._src_insp
+
+    @property
+    def _tgt_inspector(self) -> Inspector:
+        """Inspector target, общий для всех reflection-вызовов."""
+        if self._tgt_insp is None:
+            self._tgt_insp = inspect(self._tgt_conn or self.target_engine)
+        return self._tgt_insp
+
+    @contextmanager
+    def _connect(
+        self,
+        engine: Engine
+    ) -> Iterator[Connection]:
+        """Отдаёт соединение с source/target.
+
+        Внутри with (см. __enter__()) это закреплённое соединение; после
+        использования незавершённая транзакция чтения откатывается, чтобы
+        следующий begin() на нём не упал (см. _pinned_read()). Иначе
+        соединение берётся из пула на время блока.
+
+        Args:
+            engine: source_engine или target_engine.
+
+        Yields:
+            Connection: Соединение с БД.
+        """
+        pinned = self._pinned_conn(engine)
+        if pinned is None:
+            with engine.connect() as conn:
+                yield conn
+            return
+        with self._pinned_read(engine):
+            yield pinned
+
+    def _pinned_conn(
+        self,
+        engine: Engine
+    ) -> Optional[Connection]:
+        """Возвращает закреплённое за engine соединение или None."""
+        if engine is self.source_engine:
+            return self._src_conn
+        if engine is self.target_engine:
+            return self._tgt_conn
+        return None
+
+    @contextmanager
+    def _pinned_read(
+        self,
+        engine: Engine
+    ) -> Iterator[None]:
+        """Откатывает транзакцию, открытую чтением на закреплённом соединении.
+
+        SQLAlchemy 2.0 начинает транзакцию при первом execute (autobegin),
+        в том числе из Inspector; без отката apply() не сможет сделать
+        begin() на том же соединении. Транзакция, которая уже шла до
+        чтения (например, открытая в apply()), принадлежит вызывающему
+        коду и не трогается: её откат снял бы таймауты SET LOCAL и
+        advisory-блокировку схемы.
+
+        Args:
+            engine: source_engine или target_engine.
+
+        Yields:
+            None.
+        """
+        pinned = self._pinned_conn(engine)
+        if pinned is None or pinned.in_transaction():
+            yield
+            return
+        try:
+            yield
+        finally:
+            if pinned.in_transaction():
+                pinned.rollback()
+
+    def _src_table(
+        self,
+        table_name: str
+    ) -> Table:
+        """Возвращает Table source, отражая её не более одного раза.
+
+        Таблицы хранятся в общей MetaData (_src_md), поэтому
+        _plan_create_table() и _compile_src_index() для одной и той же
+        таблицы (а также таблицы, подтянутые по FK) переиспользуют уже
+        отражённый объект. MetaData создаётся при первом обращении: diff()
+        без DDL для новых таблиц и особых индексов её не выделяет.
+
+        Args:
+            table_name: Имя таблицы в source.
+
+        Returns:
+            Table: Отражённая таблица.
+        """
+        if self._src_md is None:
+            self._src_md = MetaData(schema=self.schema)
+
+        key = f'{self.schema}.{table_name}' if self.schema else table_name
+        table = self._src_md.tables.get(key)
+        if table is None:
+            table = Table(
+                table_name,
+                self._src_md,
+                autoload_with=self._src_inspector,
+            )
+        return table
+
+    def _reflect_src_tables(
+        self,
+        table_names: list[str]
+    ) -> None:
+        """Отражает набор таблиц source в _src_md одним MetaData.reflect().
+
+        В отличие от Table(autoload_with=...) на каждую таблицу, reflect()
+        использует батчевый reflection SQLAlchemy 2.0 (get_multi_columns,
+        get_multi_indexes, ...), поэтому число запросов к каталогу не
+        зависит от количества таблиц. Дальше _src_table() находит таблицы
+        в MetaData без обращения к БД.
+
+        Args:
+            table_names: Имена таблиц source.
+
+        Returns:
+            None.
+        """
+        if self._src_md is None:
+            self._src_md = MetaData(schema=self.schema)
+
+        prefix = f'{self.schema}.' if self.schema else ''
+        pending = [
+            t for t in table_names
+            if f'{prefix}{t}' not in self._src_md.tables
+        ]
+        if pending:
+            self._src_md.reflect(bind=self._src_inspector, only=pending)
+
+    def _inspector_for(
+        self,
+        engine: Engine
+    ) -> Inspector:
+        """Возвращает закэшированный Inspector для source/target engine."""
+        if engine is self.source_engine:
+            return self._src_inspector
+        return self._tgt_inspector
+
+    def _load_catalogs(self) -> tuple[CatalogSnapshot, CatalogSnapshot]:
+        """Загружает снимки каталогов source и target.
+
+        Чтение каталогов независимо и упирается в сетевые задержки, поэтому
+        при parallel_introspection=True оба каталога читаются одновременно
+        в двух потоках (каждый поток берёт своё соединение из пула engine).
+        Если source и target работают через один пул (например, общий Engine
+        из pool.get_engine() для одинаковых DSN), каталог читается один раз.
+
+        Returns:
+            tuple[CatalogSnapshot, CatalogSnapshot]: Снимки source и target.
+        """
+        if self.source_engine.pool is self.target_engine.pool:
+            catalog = self._load_catalog(self.source_engine)
+            return catalog, catalog
+
+        if not self.parallel_introspection:
+            return (
+                self._load_catalog(self.source_engine),
+                self._load_catalog(self.target_engine),
+            )
+
+        with ThreadPoolExecutor(
+            max_workers=2,
+            thread_name_prefix='introspect',
+        ) as pool:
+            src_future = pool.submit(self._load_catalog, self.source_engine)
+            tgt_future = pool.submit(self._load_catalog, self.target_engine)
+            return src_future.result(), tgt_future.result()
+
+    def _load_catalog(
+        self,
+        engine: Engine
+    ) -> CatalogSnapshot:
+        """Загружает снимок каталога БД (таблицы, колонки, индексы, FK).
+
+        Для PostgreSQL весь каталог схемы читается одним запросом к
+        pg_catalog (см. _load_catalog_postgres()). Для остальных диалектов
+        снимок собирается через SQLAlchemy Inspector.
+
+        Если задан catalog_cache и диалект умеет отдавать токен версии
+        каталога (см. _catalog_version()), снимок берётся из кэша, пока
+        токен не изменился.
+
+        Токен и каталог PostgreSQL читаются через одно соединение из пула.
+        Для Inspector соединение отпускается до reflection, чтобы один
+        поток не держал два соединения одновременно.
+
+        Args:
+            engine: SQLAlchemy Engine, каталог которого нужно прочитать.
+
+        Returns:
+            CatalogSnapshot: Снимок каталога в рамках self.schema.
+        """
+        token = None
+        catalog = None
+        with self._connect(engine) as conn:
+            if self.catalog_cache is not None:
+                token = self._catalog_version(conn)
+            if token is not None:
+                cached = self.catalog_cache.load(
+                    self._engine_key(engine),
+                    self.schema,
+                    token,
+                )
+                if cached is not None:
+                    self.logger.info(
+                        'Catalog cache hit: dialect=%s',
+                        engine.dialect.name,
+                    )
+                    return CatalogSnapshot.from_dict(cached)
+
+            if engine.dialect.name == 'postgresql':
+                catalog = self._load_catalog_postgres(conn)
+
+        if catalog is None:
+            with self._pinned_read(engine):
+                catalog = self._load_catalog_inspector(engine)
+
+        if token is not None:
+            self.catalog_cache.store(
+                self._engine_key(engine),
+                self.schema,
+                token,
+                catalog.to_dict(),
+            )
+
+        self.logger.info(
+            'Loaded catalog: dialect=%s, tables=%d',
+            engine.dialect.name,
+            len(catalog.tables),
+        )
+        return catalog
+
+    def _schemas_fingerprint_equal(self) -> bool:
+        """Проверяет, совпадают ли отпечатки схем source и target.
+
+        Отпечаток target сохраняется в _planned_fingerprint: по нему apply()
+        проверяет, что план не устарел, без отдельного запроса в diff().
+
+        Returns:
+            bool: True, если оба отпечатка получены и равны. Если диалект
+            не поддерживает отпечаток, возвращается False и diff() идёт
+            обычным путём.
+        """
+        src_fp = self._schema_fingerprint(self.source_engine)
+        if src_fp is None:
+            return False
+        if self.source_engine.pool is self.target_engine.pool:
+            self._planned_fingerprint = src_fp
+            return True
+        self._planned_fingerprint = self._schema_fingerprint(
+            self.target_engine
         )
+        return src_fp == self._planned_fingerprint
+
+    def _schema_fingerprint(
+        self,
+        engine: Engine
+    ) -> Optional[str]:
+        """Возвращает отпечаток содержимого схемы.
+
+        - PostgreSQL: md5 по таблицам, колонкам, индексам и FK схемы
+          (_PG_SCHEMA_FINGERPRINT_SQL), один запрос.
+
+        Args:
+            engine: SQLAlchemy Engine.
+
+        Returns:
+            Optional[str]: Отпечаток или None, если диалект не
+            поддерживается.
+        """
+        if engine.dialect.name != 'postgresql':
+            return None
+        with self._connect(engine) as conn:
+            return conn.execute(
+                _PG_SCHEMA_FINGERPRINT_SQL,
+                self._catalog_params(),
+            ).scalar()
+
+    def _catalog_version(
+        self,
+        conn: Connection
+    ) -> Optional[str]:
+        """Возвращает дешёвый токен версии каталога схемы.
+
+        - PostgreSQL: md5 от xmin строк pg_class/pg_attribute/pg_constraint
+          схемы (pg_catalog_version());
+        - SQLite: md5 от DDL таблиц и индексов из sqlite_master
+          (_sqlite_master_digest). PRAGMA schema_version для этого не
+          годится: у пересозданного по тому же пути файла счётчик снова
+          начинается с малых значений и может совпасть со старым токеном.
+
+        Args:
+            conn: Соединение с БД.
+
+        Returns:
+            Optional[str]: Токен или None, если диалект не поддерживается
+            (тогда кэш не используется).
+        """
+        dialect_name = conn.dialect.name
+        if dialect_name == 'postgresql':
+            value = pg_catalog_version(conn, self.schema)
+        elif dialect_name == 'sqlite':
+            value = self._sqlite_master_digest(conn)
+        else:
+            return None
+        return (
+            f'{dialect_name}:v{_SNAPSHOT_FORMAT}:{value}'
+            f'{self._filter_token()}'
+        )
+
+    def _sqlite_master_digest(
+        self,
+        conn: Connection
+    ) -> str:
+        """Возвращает md5 от записей sqlite_master схемы.
+
+        Учитываются только таблицы, проходящие фильтры include/exclude_tables,
+        и их индексы; служебные объекты sqlite_* пропускаются.
+
+        Args:
+            conn: Соединение с SQLite.
+
+        Returns:
+            str: Шестнадцатеричный md5.
+        """
+        master = 'sqlite_master'
+        if self.schema:
+            quote = conn.dialect.identifier_preparer.quote
+            master = f'{quote(self.schema)}.{master}'
+        rows = conn.exec_driver_sql(
+            f"SELECT type, name, tbl_name, sql FROM {master} "
+            "WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        ).all()
+        digest = hashlib.md5()
+        for row in rows:
+            if self._keep_table(row.tbl_name):
+                digest.update(repr(tuple(row)).encode())
+        return digest.hexdigest()
+
+    def _keep_table(
+        self,
+        table_name: str
+    ) -> bool:
+        """Проверяет, проходит ли таблица фильтры include/exclude_tables."""
+        if (
+            self.include_tables is not None
+            and table_name not in self.include_tables
+        ):
+            return False
+        return table_name not in self.exclude_tables
+
+    def _catalog_params(self) -> dict:
+        """Параметры запросов к pg_catalog: схема и фильтры таблиц."""
+        include = self.include_tables
+        return {
+            'schema': self.schema,
+            'include': sorted(include) if include is not None else None,
+            'exclude': sorted(self.exclude_tables) or None,
+        }
+
+    def _filter_token(self) -> str:
+        """Часть токена каталога, зависящая от фильтров таблиц.
+
+        Снимок в catalog_cache построен с учётом фильтров, поэтому при их
+        смене токен не должен совпасть со старым.
+        """
+        if self.include_tables is None and not self.exclude_tables:
+            return ''
+        params = self._catalog_params()
+        return f'|include={params["include"]}|exclude={params["exclude"]}'
+
+    def _engine_key(
+        self,
+        engine: Engine
+    ) -> str:
+        """Возвращает полный DSN engine (ключ для catalog_cache)."""
+        return engine.url.render_as_string(hide_password=False)
+
+    def _load_catalog_postgres(
+        self,
+        conn: Connection
+    ) -> CatalogSnapshot:
+        """Читает каталог PostgreSQL одним запросом (_PG_CATALOG_SQL).
+
+        Таблицы, колонки, индексы и FK схемы приходят за один round-trip в
+        форме, совместимой с Inspector.get_multi_*(). Типы колонок из
+        format_type() приводятся к записи компилятора типов (см.
+        _pg_type_sql()), как у снимков, прочитанных через Inspector; каждая
+        пара (format_type, collation) разбирается один раз.
+
+        Args:
+            conn: Соединение с PostgreSQL.
+
+        Returns:
+            CatalogSnapshot: Снимок каталога.
+        """
+        rows = conn.execute(
+            _PG_CATALOG_SQL,
+            self._catalog_params(),
+        ).all()
+
+        dialect = conn.dialect
+        type_sqls: dict[tuple[str, Optional[str]], str] = {}
+
+        def type_sql(c: dict) -> str:
+            key = (c['format_type'], c.get('collation'))
+            if key not in type_sqls:
+                type_sqls[key] = _pg_type_sql(dialect, *key)
+            return type_sqls[key]
+
+        columns: dict[str, dict[str, dict]] = {}
+        indexes: dict[str, list[dict]] = {}
+        foreign_keys: dict[str, list[dict]] = {}
+        for row in rows:
+            columns[row.table_name] = {
+                c['name']: {
+                    'type_sql': type_sql(c),
+                    'nullable': bool(c['nullable']),
+                    'default': c.get('default'),
+                }
+                for c in row.columns
+            }
+            indexes[row.table_name] = list(row.indexes)
+            foreign_keys[row.table_name] = list(row.foreign_keys)
+
+        return CatalogSnapshot(
+            tables=frozenset(columns),
+            columns=columns,
+            indexes=indexes,
+            foreign_keys=foreign_keys,
+        )
+
+    def _load_catalog_inspector(
+        self,
+        engine: Engine
+    ) -> CatalogSnapshot:
+        """Собирает снимок каталога через SQLAlchemy Inspector.
+
+        Используется для диалектов без специализированного запроса к каталогу
+        (например, SQLite). Сначала пробует bulk-reflection
+        (get_multi_columns/get_multi_indexes/get_multi_foreign_keys — по
+        одному вызову на всю схему); если диалект или инспектор его не
+        поддерживает либо bulk-вызов упал, читает каталог по таблицам.
+
+        Args:
+            engine: SQLAlchemy Engine, каталог которого нужно прочитать.
+
+        Returns:
+            CatalogSnapshot: Снимок каталога.
+        """
+        insp = self._inspector_for(engine)
+        tables = [
+            t for t in insp.get_table_names(schema=self.schema)
+            if self._keep_table(t)
+        ]
+
+        try:
+            columns, indexes, foreign_keys = self._reflect_catalog_bulk(
+                insp,
+                engine,
+                tables,
+            )
+        except Exception as exc:
+            self.logger.debug(
+                'Bulk reflection unavailable, reflecting per table (%s)',
+                exc,
+            )
+            columns, indexes, foreign_keys = self._reflect_catalog_per_table(
+                insp,
+                engine,
+                tables,
+            )
+
+        return CatalogSnapshot(
+            tables=frozenset(tables),
+            columns=columns,
+            indexes=indexes,
+            foreign_keys=foreign_keys,
+        )
+
+    def _reflect_catalog_bulk(
+        self,
+        insp: Inspector,
+        engine: Engine,
+        tables: list[str]
+    ) -> tuple[dict, dict, dict]:
+        """Читает колонки, индексы и FK всех таблиц схемы bulk-вызовами.
+
+        Args:
+            insp: Inspector БД.
+            engine: SQLAlchemy Engine (нужен диалект для компиляции типов).
+            tables: Таблицы схемы.
+
+        Returns:
+            tuple[dict, dict, dict]: columns, indexes и foreign_keys в формате
+            CatalogSnapshot.
+        """
+        if not tables:
+            return {}, {}, {}
+
+        multi_columns = insp.get_multi_columns(
+            schema=self.schema,
+            filter_names=tables,
+        )
+        multi_indexes = insp.get_multi_indexes(
+            schema=self.schema,
+            filter_names=tables,
+        )
+        multi_fks = insp.get_multi_foreign_keys(
+            schema=self.schema,
+            filter_names=tables,
+        )
+
+        dialect = engine.dialect
+        columns: dict[str, dict[str, dict]] = {}
+        indexes: dict[str, list[dict]] = {}
+        foreign_keys: dict[str, list[dict]] = {}
+        for table_name in tables:
+            key = (self.schema, table_name)
+            columns[table_name] = self._columns_meta(
+                multi_columns.get(key, []),
+                dialect,
+            )
+            indexes[table_name] = list(multi_indexes.get(key, []))
+            foreign_keys[table_name] = list(multi_fks.get(key, []))
+        return columns, indexes, foreign_keys
+
+    def _reflect_catalog_per_table(
+        self,
+        insp: Inspector,
+        engine: Engine,
+        tables: list[str]
+    ) -> tuple[dict, dict, dict]:
+        """Читает колонки, индексы и FK по одной таблице.
+
+        Ошибки чтения индексов/FK отдельной таблицы не прерывают diff: для
+        такой таблицы сохраняется пустой список, а в лог пишется warning.
+
+        Args:
+            insp: Inspector БД.
+            engine: SQLAlchemy Engine, каталог которого нужно прочитать.
+            tables: Таблицы схемы.
+
+        Returns:
+            tuple[dict, dict, dict]: columns, indexes и foreign_keys в формате
+            CatalogSnapshot.
+        """
+        dialect = engine.dialect
+        columns: dict[str, dict[str, dict]] = {}
+        indexes: dict[str, list[dict]] = {}
+        foreign_keys: dict[str, list[dict]] = {}
+        for table_name in tables:
+            columns[table_name] = self._columns_meta(
+                insp.get_columns(table_name, schema=self.schema),
+                dialect,
+            )
 
-        if dry_run:
-            for op in ops_list:
-                print(f'-- {op.kind}: {op.comment}\n{op.sql}\n')
-            self.logger.info('Dry-run finished. No changes applied.')
-            return
+            try:
+                indexes[table_name] = insp.get_indexes(
+                    table_name,
+                    schema=self.schema
+                )
+            except Exception as exc:
+                self.logger.warning(
+                    'Cannot reflect indexes: table=%s (%s)',
+                    table_name,
+                    exc,
+                )
+                indexes[table_name] = []
 
-        try:
-            with self.target_engine.begin() as conn:
-                self._apply_timeouts(conn)
-                for i, op in enumerate(ops_list, start=1):
-                    self.logger.info(
-                        'Executing op %d/%d: %s (%s)',
-                        i,
-                        len(ops_list),
-                        op.kind,
-                        op.comment
-                    )
-                    if op.kind == 'report':
-                        self.logger.info('Skipping report op: %s', op.comment)
-                        continue
-                    conn.execute(text(op.sql))
-            self.logger.info('Apply finished successfully.')
-        except Exception as exc:
-            self.logger.error('Apply failed: %s', exc, exc_info=True)
-            self.logger.critical('Schema correction aborted due to error.')
-            raise
+            try:
+                foreign_keys[table_name] = insp.get_foreign_keys(
+                    table_name,
+                    schema=self.schema
+                ) or []
+            except Exception as exc:
+                self.logger.warning(
+                    'Cannot reflect foreign keys: table=%s (%s)',
+                    table_name,
+                    exc,
+                )
+                foreign_keys[table_name] = []
+
+        return columns, indexes, foreign_keys
 
     def _sort_missing_tables_by_fk(
         self,
-        src_inspector,
+        src_fks: dict[str, list[dict]],
         missing: list[str]
     ) -> list[str]:
         """Сортирует список недостающих таблиц с учётом зависимостей FK.
 
         Метод пытается упорядочить создание таблиц так,
         чтобы таблицы-«родители» создавались раньше таблиц-«потомков»,
-        которые ссылаются на них через FK. Если обнаружен цикл зависимостей,
-        возвращает исходный порядок и логирует
-        предупреждение.
+        которые ссылаются на них через FK. Таблицы цикла зависимостей
+        идут подряд в исходном порядке (с предупреждением в лог), остальные
+        по-прежнему упорядочены относительно цикла.
 
         Args:
-            src_inspector: SQLAlchemy Inspector для source БД.
+            src_fks: FK source-таблиц в виде {table: [fk]}
+                (CatalogSnapshot.foreign_keys).
             missing: Список таблиц, отсутствующих в target.
 
         Returns:
             list[str]: Таблицы в порядке, безопасном для создания
             (насколько возможно).
         """
+        if len(missing) < 2:
+            return missing
+
         missing_set = set(missing)
         deps: dict[str, set[str]] = {t: set() for t in missing}
+        has_edges = False
 
         for t in missing:
-            for fk in src_inspector.get_foreign_keys(
-                t,
-                schema=self.schema
-            ) or []:
+            for fk in src_fks.get(t) or []:
                 rt = fk.get('referred_table')
-                if rt and rt in missing_set:
+                # Ссылка таблицы на саму себя порядок создания не задаёт.
+                if rt and rt != t and rt in missing_set:
                     deps[t].add(rt)
+                    has_edges = True
 
-        ready = [t for t in missing if not deps[t]]
+        if not has_edges:
+            return missing
+
+        # Алгоритм Кана: O(V + E) вместо полного прохода по missing
+        # на каждую извлечённую таблицу.
+        successors: dict[str, list[str]] = defaultdict(list)
+        for t, parents in deps.items():
+            for parent in parents:
+                successors[parent].append(t)
+        indegree = {t: len(parents) for t, parents in deps.items()}
+
+        ready = deque(t for t in missing if not indegree[t])
         out: list[str] = []
 
         while ready:
-            n = ready.pop()
+            n = ready.popleft()
             out.append(n)
-            for t in missing:
-                if n in deps[t]:
-                    deps[t].remove(n)
-                    if not deps[t] and t not in out and t not in ready:
-                        ready.append(t)
+            for t in successors.get(n, ()):
+                indegree[t] -= 1
+                if not indegree[t]:
+                    ready.append(t)
 
         if len(out) != len(missing):
-            self.logger.warning(
-                'RISKY: cycle detected in FK dependencies, '
-                'using fallback order'
-            )
-            return missing
+            # Ненулевая входящая степень остаётся только у таблиц цикла и
+            # у таблиц, зависящих от него: их упорядочиваем по компонентам
+            # сильной связности, а не сдаёмся на весь список.
+            rest = [t for t in missing if indegree[t]]
+            for component in _fk_components(rest, deps):
+                if len(component) > 1:
+                    self.logger.warning(
+                        'RISKY: cycle detected in FK dependencies '
+                        '(nodes=%s), keeping source order inside the cycle',
+                        ', '.join(sorted(component)),
+                    )
+                out.extend(component)
         return out
 
     def _plan_create_table(
         self,
-        table_name: str,
+        table: Table,
         *,
         include_foreign_keys: bool,
     ) -> list[Operation]:
         """Формирует операцию создания отсутствующей таблицы.
 
-        Таблица отражается (autoload) из source и затем генерируется DDL
-        под диалект target.
+        Таблица уже отражена из source вызывающим кодом (см. _src_table() и
+        _reflect_src_tables()); здесь только генерируется DDL под диалект
+        target.
 
         Args:
-            table_name: Имя таблицы, которую нужно создать в target.
+            table: Отражённая таблица source, которую нужно создать в target.
             include_foreign_keys: Если True — включает FK в CREATE TABLE.
                 Если False — исключает FK из CREATE TABLE
                 (для последующего добавления через ALTER).
@@ -368,152 +1850,168 @@ class SchemaCorrector:
             list[Operation]: Список операций
             (обычно одна операция create_table).
         """
-        md = MetaData(schema=self.schema)
-        table = Table(table_name, md, autoload_with=self.source_engine)
-
         fk_constraints = None if include_foreign_keys else frozenset()
         ddl = str(
             CreateTable(
                 table,
                 include_foreign_key_constraints=fk_constraints,
-            ).compile(self.target_engine)
+            ).compile(dialect=self._ddl_dialect)
         ).rstrip() + ';'
         return [
             Operation(
                 kind='create_table',
                 sql=ddl,
-                comment=f'Create table {table_name}'
+                comment=f'Create table {table.name}'
             )
         ]
 
-    def _plan_add_missing_columns(
+    def _plan_column_changes(
         self,
-        table_name: str
-    ) -> list[Operation]:
-        """Планирует добавление колонок, отсутствующих в target.
-
-        Метод сравнивает набор колонок source и target в рамках одной таблицы и
-        создаёт операции `ALTER TABLE ... ADD COLUMN ...` для тех колонок,
-        которых нет в target.
-
-        Важно: добавление выполняется “безопасно” — без автоматического
-        ужесточения nullable и без миграции типов.
+        table_name: str,
+        src_cols: dict[str, dict],
+        tgt_cols: dict[str, dict],
+    ) -> tuple[list[Operation], list[Operation], list[Operation]]:
+        """Сравнивает колонки таблицы source и target за один проход.
+
+        Возвращает сразу три группы операций:
+        - add_column для колонок, отсутствующих в target. Добавление
+          выполняется “безопасно” — без автоматического ужесточения nullable
+          и без миграции типов;
+        - report по “лишним” колонкам, которые есть только в target. Они не
+          удаляются автоматически, так как это может повредить данные;
+        - report по рискованным различиям общих колонок: различие типов и
+          попытка ужесточить nullable (source NOT NULL, target NULL).
 
         Args:
             table_name: Имя таблицы для сравнения.
+            src_cols: Колонки таблицы в source (см. _columns_meta()).
+            tgt_cols: Колонки таблицы в target (см. _columns_meta()).
 
         Returns:
-            list[Operation]: Операции add_column для таблицы.
+            tuple[list[Operation], list[Operation], list[Operation]]:
+            Операции add_column, отчёты о лишних колонках и отчёты о
+            рискованных различиях.
         """
-        src_cols = self._get_columns(self.source_engine, table_name)
-        tgt_cols = self._get_columns(self.target_engine, table_name)
-
-        ops: list[Operation] = []
+        add_ops: list[Operation] = []
+        risky_reports: list[Operation] = []
+        # Имя таблицы и метод квотирования одни на все колонки.
+        alter_prefix = f'ALTER TABLE {self._qt(table_name)} ADD COLUMN '
+        quote = self._quote
 
-        for col_name, src_col in src_cols.items():
-            if col_name in tgt_cols:
+        for col_name, src in src_cols.items():
+            src_type = src['type_sql']
+            tgt = tgt_cols.get(col_name)
+            if tgt is None:
+                sql = f'{alter_prefix}{quote(col_name)} {src_type};'
+                add_ops.append(
+                    Operation(
+                        kind='add_column',
+                        sql=sql,
+                        comment=f'Add column {table_name}.{col_name}'
+                    )
+                )
                 continue
 
-            col_type_sql = src_col['type_sql']
+            tgt_type = tgt['type_sql']
+            if src_type != tgt_type:
+                risky_reports.append(Operation(
+                    kind='report',
+                    sql='-- no-op',
+                    comment=(
+                        f'RISKY: type mismatch {table_name}.{col_name}: '
+                        f'source={src_type} target={tgt_type}'
+                    ),
+                ))
 
-            sql = (
-                f'ALTER TABLE {self._qt(table_name)} '
-                f'ADD COLUMN {self._q(col_name)} {col_type_sql};'
-            )
-            ops.append(
-                Operation(
-                    kind='add_column',
-                    sql=sql,
-                    comment=f'Add column {table_name}.{col_name}'
-                )
+            if src['nullable'] is False and tgt['nullable'] is True:
+                risky_reports.append(Operation(
+                    kind='report',
+                    sql='-- no-op',
+                    comment=(
+                        f'RISKY: nullable mismatch {table_name}.{col_name}: '
+                        'source NOT NULL, target NULL '
+                        '(need staged backfill + ALTER)'
+                    ),
+                ))
+
+        extra_reports = [
+            Operation(
+                kind='report',
+                sql='-- no-op',
+                comment=(
+                    'EXTRA: column exists only in target: '
+                    f'{table_name}.{col_name}'
+                ),
             )
+            for col_name in sorted(c for c in tgt_cols if c not in src_cols)
+        ]
 
-        return ops
+        return add_ops, extra_reports, risky_reports
 
     def _plan_add_missing_indexes(
         self,
-        table_name: str
+        table_name: str,
+        *,
+        src_indexes: list[dict],
+        tgt_indexes: list[dict],
     ) -> list[Operation]:
         """Планирует создание индексов, отсутствующих в target.
 
-        Алгоритм:
-        1) Получает список индексов target через Inspector.get_indexes().
-        2) Пытается получить индексы source через
-            Table(...).indexes (reflection).
-        3) Если reflection не дал полной картины, добирает индексы из source
-           через Inspector.get_indexes().
+        Метод работает только со снимками каталога: разность имён индексов
+        source и target. Обычный индекс по колонкам собирается шаблоном
+        через _q()/_qt(); индексы с особенностями диалекта (partial, USING,
+        INCLUDE, порядок сортировки) и индексы по выражениям компилируются
+        через CreateIndex из отражённой таблицы source (см. _src_table()),
+        чтобы DDL не потерял эти детали.
 
         Args:
             table_name: Имя таблицы, для которой нужно синхронизировать
             индексы.
+            src_indexes: Индексы таблицы в source
+                (CatalogSnapshot.indexes).
+            tgt_indexes: Индексы таблицы в target
+                (CatalogSnapshot.indexes).
 
         Returns:
             list[Operation]: Операции create_index для отсутствующих индексов.
         """
-        tgt_inspector = inspect(self.target_engine)
-        try:
-            tgt_indexes = tgt_inspector.get_indexes(
-                table_name,
-                schema=self.schema
-            )
-        except Exception:
-            tgt_indexes = []
-
         tgt_index_names = {
             i.get('name') for i in tgt_indexes if i.get('name')
         }
 
         ops: list[Operation] = []
-
-        md = MetaData(schema=self.schema)
-        src_table = Table(
-            table_name,
-            md,
-            autoload_with=self.source_engine
-        )
-
-        for idx in src_table.indexes:
-            if idx.name and idx.name not in tgt_index_names:
-                ddl = str(
-                    CreateIndex(idx).compile(self.target_engine)
-                ).rstrip() + ';'
-                ops.append(
-                    Operation(
-                        kind='create_index',
-                        sql=ddl,
-                        comment=f'Create index {idx.name}'
-                    )
-                )
-
-        prefix = 'Create index '
-        planned_names = {
-            op.comment.removeprefix(prefix)
-            for op in ops
-            if op.kind == 'create_index' and op.comment.startswith(prefix)
-        }
-
-        src_inspector = inspect(self.source_engine)
-        for info in src_inspector.get_indexes(
-            table_name,
-            schema=self.schema
-        ):
+        quote = self._quote
+        qt = None
+        for info in src_indexes:
             name = info.get('name')
+            if not name or name in tgt_index_names:
+                continue
+
             cols = info.get('column_names') or []
-            unique = bool(info.get('unique'))
             if (
-                not name
-                or not cols
-                or name in tgt_index_names
-                or name in planned_names
+                cols
+                and all(cols)
+                and not info.get('dialect_options')
+                and not info.get('column_sorting')
             ):
-                continue
+                unique_sql = 'UNIQUE ' if info.get('unique') else ''
+                if qt is None:
+                    qt = self._qt(table_name)
+                cols_sql = ', '.join(map(quote, cols))
+                sql = (
+                    f'CREATE {unique_sql}INDEX {quote(name)} '
+                    f'ON {qt} ({cols_sql});'
+                )
+            else:
+                sql = self._compile_src_index(table_name, name)
+                if sql is None:
+                    self.logger.warning(
+                        'Cannot build DDL for index %s.%s, skipped',
+                        table_name,
+                        name,
+                    )
+                    continue
 
-            unique_sql = 'UNIQUE ' if unique else ''
-            cols_sql = ', '.join(self._q(c) for c in cols)
-            sql = (
-                f'CREATE {unique_sql}INDEX {self._q(name)} '
-                f'ON {self._qt(table_name)} ({cols_sql});'
-            )
             ops.append(
                 Operation(
                     kind='create_index',
@@ -523,10 +2021,32 @@ class SchemaCorrector:
             )
         return ops
 
+    def _compile_src_index(
+        self,
+        table_name: str,
+        index_name: str
+    ) -> Optional[str]:
+        """Компилирует CREATE INDEX для индекса source через CreateIndex.
+
+        Args:
+            table_name: Имя таблицы в source.
+            index_name: Имя индекса.
+
+        Returns:
+            Optional[str]: DDL индекса или None, если reflection таблицы
+            не вернул такой индекс.
+        """
+        for idx in self._src_table(table_name).indexes:
+            if idx.name == index_name:
+                return str(
+                    CreateIndex(idx).compile(dialect=self._ddl_dialect)
+                ).rstrip() + ';'
+        return None
+
     def _plan_add_foreign_keys_for_new_table(
         self,
-        src_inspector,
         table_name: str,
+        src_fks: list[dict],
     ) -> list[Operation]:
         """Планирует добавление FK для новой таблицы через ALTER TABLE.
 
@@ -539,8 +2059,8 @@ class SchemaCorrector:
         включены в CREATE TABLE (см. include_foreign_keys в _plan_create_table()).
 
         Args:
-            src_inspector: Inspector для source БД.
             table_name: Имя таблицы, для которой планируются FK.
+            src_fks: FK таблицы в source (CatalogSnapshot.foreign_keys).
 
         Returns:
             list[Operation]: Операции add_foreign_key.
@@ -548,10 +2068,6 @@ class SchemaCorrector:
         if self._is_sqlite():
             return []
 
-        src_fks = src_inspector.get_foreign_keys(
-            table_name,
-            schema=self.schema
-        ) or []
         return self._plan_foreign_keys(
             table_name=table_name,
             src_fks=src_fks,
@@ -560,11 +2076,13 @@ class SchemaCorrector:
 
     def _plan_add_missing_foreign_keys(
         self,
-        table_name: str
+        table_name: str,
+        src_fks: list[dict],
+        tgt_fks: list[dict],
     ) -> list[Operation]:
         """Планирует добавление отсутствующих FK для существующей таблицы.
 
-уч        Используется в diff() для таблиц, которые присутствуют и в source, и в
+        Используется в diff() для таблиц, которые присутствуют и в source, и в
         target (common_tables).
 
         Поведение зависит от диалекта:
@@ -578,26 +2096,12 @@ class SchemaCorrector:
 
         Args:
             table_name: Имя таблицы для сравнения.
+            src_fks: FK таблицы в source (CatalogSnapshot.foreign_keys).
+            tgt_fks: FK таблицы в target (CatalogSnapshot.foreign_keys).
 
         Returns:
             list[Operation]: Операции add_foreign_key или report.
         """
-        src_inspector = inspect(self.source_engine)
-        tgt_inspector = inspect(self.target_engine)
-
-        src_fks = src_inspector.get_foreign_keys(
-            table_name,
-            schema=self.schema
-        ) or []
-
-        try:
-            tgt_fks = tgt_inspector.get_foreign_keys(
-                table_name,
-                schema=self.schema
-            ) or []
-        except Exception:
-            tgt_fks = []
-
         if self._is_sqlite():
             src_sigs = {self._fk_signature(fk) for fk in src_fks}
             tgt_sigs = {self._fk_signature(fk) for fk in tgt_fks}
@@ -647,7 +2151,19 @@ class SchemaCorrector:
         Returns:
             list[Operation]: Операции add_foreign_key.
         """
-        tgt_sigs = {self._fk_signature(fk) for fk in (tgt_fks or [])}
+        if tgt_fks is None:
+            pending = src_fks
+        else:
+            # Сигнатура каждого FK считается один раз; в типичном случае
+            # (все FK уже есть в target) дальше ничего не строится.
+            tgt_sigs = frozenset(map(self._fk_signature, tgt_fks))
+            pending = [
+                fk for fk in src_fks
+                if self._fk_signature(fk) not in tgt_sigs
+            ]
+            if not pending:
+                return []
+
         ops: list[Operation] = []
 
         tgt_by_cols: dict[tuple[str, ...], list[dict]] = defaultdict(list)
@@ -670,12 +2186,8 @@ class SchemaCorrector:
         def _fmt_cols(key: tuple[str, ...]) -> str:
             return ','.join(key) if key else '<unknown>'
 
-        for fk in src_fks:
-            sig = self._fk_signature(fk)
+        for fk in pending:
             if tgt_fks is not None:
-                if sig in tgt_sigs:
-                    continue
-
                 key = self._fk_cols_key(fk)
                 if key and key in tgt_by_cols:
                     tgt_refs = ', '.join(_fmt_ref(t) for t in tgt_by_cols[key])
@@ -694,6 +2206,8 @@ class SchemaCorrector:
             op = self._build_fk_operation(table_name, fk)
             if op is not None:
                 ops.append(op)
+                if self._is_postgres():
+                    ops.append(self._build_fk_validation(table_name, fk))
 
         return ops
 
@@ -752,38 +2266,70 @@ class SchemaCorrector:
         if not cols or not ref_cols:
             return None
 
-        cols_sql = ', '.join(self._q(c) for c in cols)
-        ref_cols_sql = ', '.join(self._q(c) for c in ref_cols)
+        q = self._q
+        cols_sql = ', '.join(map(q, cols))
+        ref_cols_sql = ', '.join(map(q, ref_cols))
 
-        if ref_schema:
-            ref_table_sql = f'{self._q(ref_schema)}.{self._q(ref_table)}'
+        # Обычно FK ссылается в ту же схему: тогда подходит уже готовый
+        # префикс схемы из _qt(), иначе схема квотируется отдельно.
+        if ref_schema == self.schema:
+            ref_table_sql = self._qt(ref_table)
         else:
-            ref_table_sql = self._q(ref_table)
-
-        sql = (
-            f'ALTER TABLE {self._qt(table_name)} '
-            f'ADD CONSTRAINT {self._q(name)} '
-            f'FOREIGN KEY ({cols_sql}) '
-            f'REFERENCES {ref_table_sql} ({ref_cols_sql})'
-        )
+            ref_table_sql = f'{q(ref_schema)}.{q(ref_table)}'
+
+        # Части собираются списком и склеиваются один раз.
+        parts = [
+            f'ALTER TABLE {self._qt(table_name)}',
+            f'ADD CONSTRAINT {q(name)}',
+            f'FOREIGN KEY ({cols_sql})',
+            f'REFERENCES {ref_table_sql} ({ref_cols_sql})',
+        ]
 
         opts = fk.get('options') or {}
-        if opts.get('ondelete'):
-            sql += f' ON DELETE {opts["ondelete"]}'
-        if opts.get('onupdate'):
-            sql += f' ON UPDATE {opts["onupdate"]}'
-
-        if self.target_engine.dialect.name == 'postgresql':
-            sql += ' NOT VALID'
+        ondelete = opts.get('ondelete')
+        onupdate = opts.get('onupdate')
+        if ondelete:
+            parts.append(f'ON DELETE {ondelete}')
+        if onupdate:
+            parts.append(f'ON UPDATE {onupdate}')
 
-        sql += ';'
+        if self._is_postgres():
+            parts.append('NOT VALID')
 
         return Operation(
             kind='add_foreign_key',
-            sql=sql,
+            sql=' '.join(parts) + ';',
             comment=f'Add foreign key {table_name}.{name}',
         )
 
+    def _build_fk_validation(
+        self,
+        table_name: str,
+        fk: dict
+    ) -> Operation:
+        """Формирует VALIDATE CONSTRAINT для FK, добавленного как NOT VALID.
+
+        apply() выполняет такие операции отдельной транзакцией после
+        основной: VALIDATE берёт более слабую блокировку (SHARE UPDATE
+        EXCLUSIVE), чем ADD CONSTRAINT, и не держит её вместе с остальным DDL.
+
+        Args:
+            table_name: Имя таблицы с FK.
+            fk: Словарь с описанием FK (см. _build_fk_operation()).
+
+        Returns:
+            Operation: Operation(kind='validate_foreign_key').
+        """
+        name = fk.get('name') or self._make_fk_name(table_name, fk)
+        return Operation(
+            kind='validate_foreign_key',
+            sql=(
+                f'ALTER TABLE {self._qt(table_name)} '
+                f'VALIDATE CONSTRAINT {self._q(name)};'
+            ),
+            comment=f'Validate foreign key {table_name}.{name}',
+        )
+
     def _fk_signature(
         self,
         fk: dict
@@ -810,143 +2356,213 @@ class SchemaCorrector:
         name = f'fk_{table_name}_{cols}_{ref}'
         return name[:60]
 
-    def _report_extra_columns(
+    def _columns_meta(
         self,
-        table_name: str
-    ) -> list[Operation]:
-        """Формирует отчёт по “лишним” колонкам, которые есть только в target.
+        cols: list[dict],
+        dialect: Dialect
+    ) -> dict:
+        """Приводит колонки Inspector к формату {column_name: meta}.
 
-        Лишние колонки не удаляются автоматически, так как это может повредить
-        данные. Вместо этого возвращаются операции kind='report'.
+        Типы компилируются в строковое SQL-представление один раз — при
+        загрузке каталога; дальше diff() сравнивает уже готовые строки.
 
         Args:
-            table_name: Имя таблицы для анализа.
+            cols: Колонки в формате Inspector.get_columns().
+            dialect: Диалект для компиляции типов в SQL.
 
         Returns:
-            list[Operation]: Операции отчёта (report) по лишним колонкам.
+            dict: Словарь вида {column_name: meta}, где meta содержит:
+                - type_sql: SQL-представление типа колонки;
+                - nullable: True/False;
+                - default: значение default (если доступно инспектору).
         """
-        src_cols = self._get_columns(self.source_engine, table_name)
-        tgt_cols = self._get_columns(self.target_engine, table_name)
-
-        extra_cols = sorted(set(tgt_cols) - set(src_cols))
-        ops: list[Operation] = []
-        for col_name in extra_cols:
-            msg = (
-                f'EXTRA: column exists only in target: {table_name}.{col_name}'
-            )
-            ops.append(Operation(kind='report', sql='-- no-op', comment=msg))
-        return ops
+        out: dict[str, dict[str, object]] = {}
+        for c in cols:
+            type_sql = c['type'].compile(dialect=dialect)
+            out[c['name']] = {
+                'type_sql': str(type_sql),
+                'nullable': bool(c.get('nullable', True)),
+                'default': c.get('default'),
+            }
+        return out
 
-    def _report_risky_differences(
+    def _apply_timeouts(
         self,
-        table_name: str
-    ) -> list[Operation]:
-        """Формирует отчёт по рискованным различиям между source и target.
+        conn
+    ) -> None:
+        """Устанавливает таймауты для транзакции (только PostgreSQL).
 
-        К рискованным различиям относятся изменения, которые потенциально могут
-        повредить данные или привести к ошибкам при выполнении:
-        - различие типов колонок;
-        - попытка ужесточить nullable (source NOT NULL, target NULL).
+        В текущей реализации поддерживается только PostgreSQL, т.к. параметры
+        `lock_timeout` и `statement_timeout` являются PostgreSQL-специфичными.
+        Оба SET LOCAL уходят одним multi-statement запросом (один round-trip)
+        и действуют только до конца транзакции, поэтому не остаются на
+        соединении, возвращённом в пул.
 
         Args:
-            table_name: Имя таблицы для анализа.
+            conn: SQLAlchemy Connection/Session connection из begin().
 
         Returns:
-            list[Operation]: Операции отчёта (report) по рискованным различиям.
+            None.
         """
-        src_cols = self._get_columns(self.source_engine, table_name)
-        tgt_cols = self._get_columns(self.target_engine, table_name)
+        if not self._is_postgres():
+            return
 
-        ops: list[Operation] = []
+        statements: list[str] = []
+        if self.lock_timeout_seconds > 0:
+            statements.append(
+                f"SET LOCAL lock_timeout = '{self.lock_timeout_seconds}s'"
+            )
+        if self.statement_timeout_seconds > 0:
+            statements.append(
+                'SET LOCAL statement_timeout = '
+                f"'{self.statement_timeout_seconds}s'"
+            )
+        if not statements:
+            return
 
-        for col_name, src in src_cols.items():
-            tgt = tgt_cols.get(col_name)
-            if not tgt:
-                continue
+        conn.exec_driver_sql(
+            '; '.join(statements),
+            execution_options=_RAW_SQL_OPTIONS,
+        )
 
-            if src['type_sql'] != tgt['type_sql']:
-                ops.append(Operation(
-                    kind='report',
-                    sql='-- no-op',
-                    comment=(
-                        f'RISKY: type mismatch {table_name}.{col_name}: '
-                        f'source={src["type_sql"]} target={tgt["type_sql"]}'
-                    ),
-                ))
+    def _acquire_schema_lock(
+        self,
+        conn
+    ) -> None:
+        """Берёт транзакционную advisory-блокировку схемы (только PostgreSQL).
 
-            if src['nullable'] is False and tgt['nullable'] is True:
-                ops.append(Operation(
-                    kind='report',
-                    sql='-- no-op',
-                    comment=(
-                        f'RISKY: nullable mismatch {table_name}.{col_name}: '
-                        'source NOT NULL, target NULL '
-                        '(need staged backfill + ALTER)'
-                    ),
-                ))
+        Ключ блокировки зависит от имени схемы, поэтому коррекции разных схем
+        одной БД идут параллельно, а две коррекции одной схемы —
+        последовательно. Ожидание ограничено lock_timeout (см.
+        _apply_timeouts()), блокировка снимается при завершении транзакции.
 
-        return ops
+        Args:
+            conn: SQLAlchemy Connection из begin().
+
+        Returns:
+            None.
+        """
+        if not self._is_postgres():
+            return
+
+        conn.execute(
+            _PG_SCHEMA_LOCK_SQL,
+            {'prefix': SCHEMA_LOCK_PREFIX, 'schema': self.schema},
+        )
 
-    def _get_columns(
+    def _check_plan_is_current(
         self,
-        engine: Engine,
-        table_name: str
-    ) -> dict:
-        """Возвращает метаданные колонок таблицы.
+        conn
+    ) -> None:
+        """Проверяет, что схема target не менялась с момента планирования.
 
-        Использует SQLAlchemy Inspector для получения списка колонок и приводит
-        типы к строковому SQL-представлению для сравнения.
+        Вызывается после _acquire_schema_lock(): две коррекции одной схемы
+        могут одновременно построить план по старому каталогу, и вторая,
+        дождавшись блокировки, применила бы уже неактуальный DDL. Проверка
+        есть только для PostgreSQL и для плана, построенного этим
+        корректором. Если diff() уже снял отпечаток target (fast_equal_skip),
+        сверяется отпечаток; иначе каталог target перечитывается здесь и
+        сравнивается со снимком, по которому строился план, — diff() при
+        этом не делает лишних запросов.
 
         Args:
-            engine: SQLAlchemy Engine, из которого нужно прочитать схему.
-            table_name: Имя таблицы.
+            conn: SQLAlchemy Connection из begin().
+
+        Raises:
+            RuntimeError: Схема target отличается от той, по которой
+                diff() строил план.
 
         Returns:
-            dict: Словарь вида {column_name: meta}, где meta содержит:
-                - type_sql: SQL-представление типа колонки;
-                - nullable: True/False;
-                - default: значение default (если доступно инспектору).
+            None.
         """
-        insp = inspect(engine)
-        cols = insp.get_columns(table_name, schema=self.schema)
+        if not self._is_postgres():
+            return
 
-        out: dict[str, dict[str, object]] = {}
-        for c in cols:
-            type_sql = c['type'].compile(dialect=engine.dialect)
-            out[c['name']] = {
-                'type_sql': str(type_sql),
-                'nullable': bool(c.get('nullable', True)),
-                'default': c.get('default'),
-            }
-        return out
+        if self._planned_fingerprint is not None:
+            stale = conn.execute(
+                _PG_SCHEMA_FINGERPRINT_SQL,
+                self._catalog_params(),
+            ).scalar() != self._planned_fingerprint
+        elif self._planned_catalog is not None:
+            stale = self._load_catalog_postgres(conn).to_dict() != (
+                self._planned_catalog.to_dict()
+            )
+        else:
+            return
 
-    def _apply_timeouts(
+        if stale:
+            raise RuntimeError(
+                'Target schema changed since diff(); '
+                'run diff() again before apply()'
+            )
+
+    def _execute_batch(
         self,
-        conn
+        conn,
+        statements: list[str]
     ) -> None:
-        """Устанавливает таймауты для транзакции (только PostgreSQL).
+        """Выполняет пачку SQL-операций в текущей транзакции.
 
-        В текущей реализации поддерживается только PostgreSQL, т.к. параметры
-        `lock_timeout` и `statement_timeout` являются PostgreSQL-специфичными.
+        Для PostgreSQL пачка склеивается в один multi-statement запрос и
+        уходит на сервер за один round-trip (simple query protocol).
+        Остальные диалекты (например, SQLite) не принимают несколько
+        выражений в одном execute, поэтому там операции выполняются по одной.
+
+        Ошибка в multi-statement запросе не говорит, какая из операций
+        упала, поэтому батч обёрнут в savepoint внутри того же запроса
+        (без лишних round-trip). При DBAPIError транзакция откатывается к
+        savepoint, а операции батча повторяются по одной: упадёт именно
+        проблемная, и её SQL попадёт в исключение и в лог. Ошибки
+        блокировок и таймаутов (_NO_RETRY_SQLSTATES), как и потеря
+        соединения, пробрасываются сразу: повтор только удвоил бы ожидание.
+
+        DDL в Operation.sql уже полностью отрендерен, поэтому всё уходит через
+        exec_driver_sql() без text(): SQL-компилятор SQLAlchemy и разбор
+        bind-параметров пропускаются.
 
         Args:
-            conn: SQLAlchemy Connection/Session connection из begin().
+            conn: SQLAlchemy Connection из begin().
+            statements: SQL-операции в порядке выполнения.
 
         Returns:
             None.
         """
-        if self.target_engine.dialect.name != 'postgresql':
+        if not statements:
             return
 
-        if self.lock_timeout_seconds > 0:
-            lock_sql = f"SET lock_timeout = '{self.lock_timeout_seconds}s'"
-            conn.execute(text(lock_sql))
+        if (
+            len(statements) > 1
+            and self._is_postgres()
+        ):
+            self.logger.info('Executing batch: statements=%d', len(statements))
+            script = '\n'.join((
+                f'SAVEPOINT {_BATCH_SAVEPOINT};',
+                *statements,
+                f'RELEASE SAVEPOINT {_BATCH_SAVEPOINT};',
+            ))
+            try:
+                conn.exec_driver_sql(
+                    script,
+                    execution_options=_RAW_SQL_OPTIONS,
+                )
+                return
+            except DBAPIError as exc:
+                if (
+                    exc.connection_invalidated
+                    or _sqlstate(exc) in _NO_RETRY_SQLSTATES
+                ):
+                    raise
+                self.logger.warning(
+                    'Batch failed, retrying statements one by one: %s',
+                    exc.orig,
+                )
+                conn.exec_driver_sql(
+                    f'ROLLBACK TO SAVEPOINT {_BATCH_SAVEPOINT}',
+                    execution_options=_RAW_SQL_OPTIONS,
+                )
 
-        if self.statement_timeout_seconds > 0:
-            stmt_sql = (
-                f"SET statement_timeout = '{self.statement_timeout_seconds}s'"
-            )
-            conn.execute(text(stmt_sql))
+        for sql in statements:
+            conn.exec_driver_sql(sql, execution_options=_RAW_SQL_OPTIONS)
 
     def _q(
         self,
@@ -963,9 +2579,7 @@ class SchemaCorrector:
         Returns:
             str: Квотированное имя идентификатора.
         """
-        return self.target_engine.dialect.identifier_preparer.quote_identifier(
-            name
-        )
+        return self._quote(name)
 
     def _qt(
         self,
@@ -982,10 +2596,12 @@ class SchemaCorrector:
         Returns:
             str: Квотированное имя таблицы (возможно schema-qualified).
         """
-        if self.schema:
-            return f'{self._q(self.schema)}.{self._q(table_name)}'
-        return self._q(table_name)
+        return self._schema_prefix + self._quote(table_name)
 
     def _is_sqlite(self) -> bool:
         """Возвращает True, если target-диалект SQLite."""
-        return self.target_engine.dialect.name == 'sqlite'
+        return self._target_dialect == 'sqlite'
+
+    def _is_postgres(self) -> bool:
+        """Возвращает True, если target-диалект PostgreSQL."""
+        return self._target_dialect == 'postgresql'
@@ -1,6 +1,15 @@
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
-)
+LOG_FORMAT = "%(asctime)s %(name)s %(levelname)s: %(message)s"
+
+
+def configure(level: str | int = logging.INFO) -> None:
+    """Настраивает базовый logging для CLI.
+
+    Args:
+        level: Уровень логирования (имя или число).
+
+    Returns:
+        None.
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
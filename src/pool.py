@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import atexit
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+_engines: dict[tuple, Engine] = {}
+_lock = threading.Lock()
+
+
+def get_engine(url: str, **options) -> Engine:
+    """Возвращает общий для процесса Engine (и его пул соединений) по DSN.
+
+    Повторные вызовы с тем же url и options отдают тот же Engine, поэтому
+    несколько SchemaCorrector в одном процессе (цикл в тестах, оркестратор,
+    несколько схем в CLI) переиспользуют уже открытые соединения вместо
+    нового TCP/TLS/auth на каждый запуск.
+
+    Args:
+        url: DSN базы данных.
+        **options: Аргументы create_engine() (pool_size, max_overflow, ...).
+
+    Returns:
+        Engine: Закэшированный SQLAlchemy Engine.
+    """
+    key = (url, tuple(sorted(options.items())))
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(url, **options)
+            _engines[key] = engine
+        return engine
+
+
+def dispose_all() -> None:
+    """Закрывает пулы всех закэшированных Engine и очищает кэш.
+
+    Регистрируется через atexit, но может вызываться и вручную.
+
+    Returns:
+        None.
+    """
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+atexit.register(dispose_all)
@@ -6,107 +6,173 @@ from sqlalchemy import (
     MetaData,
     String,
     Table,
-    text,
 )
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 
-def _tbl(schema: str | None, table_name: str) -> str:
-    """Формирует schema-qualified имя таблицы для SQL.
+# Таблицы описаны один раз без схемы; для PostgreSQL вызывающий код задаёт
+# схему через search_path (_create_script()) или schema_translate_map
+# (_seed_target_data()).
+_SOURCE_MD = MetaData()
+
+_source_users = Table(
+    'users',
+    _SOURCE_MD,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(255), nullable=False),
+    Column('age', Integer, nullable=True),
+)
+Index('ix_users_email', _source_users.c.email)
+
+_source_orders = Table(
+    'orders',
+    _SOURCE_MD,
+    Column('id', Integer, primary_key=True),
+    Column(
+        'user_id',
+        Integer,
+        ForeignKey('users.id'),
+        nullable=False,
+    ),
+    Column('total', Integer, nullable=False),
+)
+Index('ix_orders_user_id', _source_orders.c.user_id)
+
+_TARGET_MD = MetaData()
+
+Table(
+    'users',
+    _TARGET_MD,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(255), nullable=True),
+    Column('legacy', String(50), nullable=True),
+)
+
+Table(
+    'notes',
+    _TARGET_MD,
+    Column('id', Integer, primary_key=True),
+    Column('text', String(255), nullable=True),
+)
+
+_SEED_ROWS = {
+    'users': [{'id': 1, 'email': 'user@example.com', 'legacy': 'keep-me'}],
+    'notes': [{'id': 1, 'text': 'hello'}],
+}
+
+
+def _create_source_schema(engine) -> None:
+    """Создаёт эталонную схему (source) в SQLite базе.
+
+    PostgreSQL-схемы строятся скриптом в tests/integration/conftest.py
+    (_rebuild_schema()).
 
     Args:
-        schema: Имя схемы или None.
-        table_name: Имя таблицы.
+        engine: SQLAlchemy Engine source базы.
 
     Returns:
-        str: '"schema"."table"' или '"table"'.
+        None.
     """
-    if schema:
-        return f'"{schema}"."{table_name}"'
-    return f'"{table_name}"'
+    _execute_sqlite_script(engine, _SOURCE_MD)
 
 
-def _create_source_schema(engine, *, schema: str | None = None) -> None:
-    """Создаёт эталонную схему (source).
+def _create_target_schema(engine) -> None:
+    """Создаёт текущую схему (target) в SQLite базе и наполняет данными.
 
     Args:
-        engine: SQLAlchemy Engine для source базы.
-        schema: Имя схемы (для PostgreSQL) или None (для SQLite).
+        engine: SQLAlchemy Engine target базы.
 
     Returns:
         None.
     """
-    md = MetaData(schema=schema)
-
-    users = Table(
-        'users',
-        md,
-        Column('id', Integer, primary_key=True),
-        Column('email', String(255), nullable=False),
-        Column('age', Integer, nullable=True),
-    )
-    Index('ix_users_email', users.c.email)
-
-    orders = Table(
-        'orders',
-        md,
-        Column('id', Integer, primary_key=True),
-        Column(
-            'user_id',
-            Integer,
-            ForeignKey('users.id'),
-            nullable=False,
-        ),
-        Column('total', Integer, nullable=False),
-    )
-    Index('ix_orders_user_id', orders.c.user_id)
+    _execute_sqlite_script(engine, _TARGET_MD)
 
-    md.create_all(engine)
 
+def _execute_sqlite_script(engine, md: MetaData) -> None:
+    """Выполняет _create_script(md) одним вызовом sqlite3 executescript().
 
-def _create_target_schema(engine, *, schema: str | None = None) -> None:
-    """Создаёт текущую схему (target) и наполняет данными.
+    executescript() сам фиксирует открытую транзакцию, поэтому скрипт идёт
+    через сырое DBAPI-соединение, минуя транзакции SQLAlchemy.
 
     Args:
-        engine: SQLAlchemy Engine для target базы.
-        schema: Имя схемы (для PostgreSQL) или None (для SQLite).
+        engine: SQLAlchemy Engine SQLite базы.
+        md: _SOURCE_MD или _TARGET_MD.
 
     Returns:
         None.
     """
-    md = MetaData(schema=schema)
-
-    Table(
-        'users',
-        md,
-        Column('id', Integer, primary_key=True),
-        Column('email', String(255), nullable=True),
-        Column('legacy', String(50), nullable=True),
-    )
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.executescript(
+            _create_script(md, engine.dialect)
+        )
+    finally:
+        raw.close()
 
-    Table(
-        'notes',
-        md,
-        Column('id', Integer, primary_key=True),
-        Column('text', String(255), nullable=True),
-    )
 
-    md.create_all(engine)
+def _seed_target_data(conn) -> None:
+    """Наполняет target-таблицы users и notes исходными строками.
 
-    users_t = _tbl(schema, 'users')
-    notes_t = _tbl(schema, 'notes')
+    Args:
+        conn: Соединение с открытой транзакцией.
 
-    with engine.begin() as conn:
-        conn.execute(
-            text(
-                f'INSERT INTO {users_t} (id, email, legacy) '
-                'VALUES (1, :email, :legacy)'
-            ),
-            {'email': 'user@example.com', 'legacy': 'keep-me'},
-        )
-        conn.execute(
-            text(
-                f'INSERT INTO {notes_t} (id, text) '
-                'VALUES (1, :text)'
-            ),
-            {'text': 'hello'},
+    Returns:
+        None.
+    """
+    for table_name, rows in _SEED_ROWS.items():
+        conn.execute(_TARGET_MD.tables[table_name].insert(), rows)
+
+
+# Скрипты _create_script() по (md, имя диалекта). Ключ — имя, а не сам
+# диалект: у каждой target-базы свой Engine и свой экземпляр диалекта, а SQL
+# от экземпляра не зависит.
+_SCRIPTS: dict[tuple[MetaData, str], str] = {}
+
+
+def _create_script(md: MetaData, dialect) -> str:
+    """Возвращает скрипт создания таблиц md (и наполнения target).
+
+    Скрипт не содержит имени схемы: вызывающий код задаёт её через
+    search_path. DDL компилируется один раз за сессию на каждую пару
+    (md, диалект) и дальше берётся из _SCRIPTS.
+
+    Args:
+        md: _SOURCE_MD или _TARGET_MD.
+        dialect: Диалект, под который компилируется SQL.
+
+    Returns:
+        str: CREATE TABLE/CREATE INDEX (и INSERT для target) через ';'.
+    """
+    key = (md, dialect.name)
+    script = _SCRIPTS.get(key)
+    if script is None:
+        script = _SCRIPTS[key] = _compile_script(md, dialect)
+    return script
+
+
+def _compile_script(md: MetaData, dialect) -> str:
+    """Компилирует создание таблиц md (и наполнение target) в один скрипт.
+
+    Args:
+        md: _SOURCE_MD или _TARGET_MD.
+        dialect: Диалект, под который компилируется SQL.
+
+    Returns:
+        str: CREATE TABLE/CREATE INDEX (и INSERT для target) через ';'.
+    """
+    statements = []
+    for table in md.sorted_tables:
+        statements.append(CreateTable(table))
+        statements.extend(
+            CreateIndex(index)
+            for index in sorted(table.indexes, key=lambda i: i.name)
         )
+    if md is _TARGET_MD:
+        for table_name, rows in _SEED_ROWS.items():
+            table = md.tables[table_name]
+            statements.extend(table.insert().values(row) for row in rows)
+    compile_kwargs = {'literal_binds': True}
+    return ''.join(
+        f'{stmt.compile(dialect=dialect, compile_kwargs=compile_kwargs)};\n'
+        for stmt in statements
+    )
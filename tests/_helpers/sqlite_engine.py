@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+
+# Тестовым базам не нужна надёжность: без fsync и файлового журнала каждый
+# CREATE TABLE/INSERT не ждёт диска. locking_mode=EXCLUSIVE не включается:
+# фикстуры, проверки тестов и SchemaCorrector открывают одну базу разными
+# соединениями.
+_SPEED_PRAGMAS = (
+    'PRAGMA synchronous=OFF',
+    'PRAGMA journal_mode=MEMORY',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def tune_sqlite(engine: Engine) -> Engine:
+    """Включает на соединениях SQLite Engine PRAGMA для быстрых тестов.
+
+    Args:
+        engine: SQLAlchemy Engine; для других диалектов не меняется.
+
+    Returns:
+        Engine: Тот же engine.
+    """
+    if engine.dialect.name != 'sqlite':
+        return engine
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, _record) -> None:
+        cursor = dbapi_conn.cursor()
+        for pragma in _SPEED_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def create_test_engine(url: str, **options) -> Engine:
+    """Создаёт Engine для тестов (см. tune_sqlite()).
+
+    Сигнатура совпадает с engine_factory SchemaCorrector, поэтому функцию
+    можно передавать туда напрямую.
+
+    Args:
+        url: DSN базы данных.
+        **options: Аргументы create_engine().
+
+    Returns:
+        Engine: Новый Engine.
+    """
+    return tune_sqlite(create_engine(url, **options))
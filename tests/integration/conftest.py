@@ -2,47 +2,96 @@ from __future__ import annotations
 
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
-from sqlalchemy import (
-    create_engine,
-    text,
-)
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
 
+from corrector import pg_catalog_version
 from tests._helpers.schema_builders import (
+    _SOURCE_MD,
+    _TARGET_MD,
+    _create_script,
     _create_source_schema,
     _create_target_schema,
+    _seed_target_data,
 )
+from tests._helpers.sqlite_engine import create_test_engine
 
 
-@pytest.fixture()
-def db_urls(tmp_path: Path):
+@pytest.fixture(scope='session')
+def engine_for():
+    """Возвращает фабрику Engine, общих для всей сессии по DSN.
+
+    create_engine() на каждую проверку заново строит диалект и пул и
+    открывает новое соединение; здесь Engine создаётся один раз на DSN и
+    закрывается в конце сессии. Только для DSN, которые живут всю сессию
+    (source SQLite, PostgreSQL): target SQLite у каждого теста свой, см.
+    sqlite_target_engine. SQLite-соединения получают PRAGMA для
+    быстрых тестов (см. tests._helpers.sqlite_engine).
+
+    Yields:
+        Callable[[str], Engine]: Функция url -> Engine.
     """
-    Возвращает DSN для source и target SQLite баз во временной директории.
+    engines: dict[str, Engine] = {}
+
+    def _get(url: str) -> Engine:
+        engine = engines.get(url)
+        if engine is None:
+            engine = engines[url] = create_test_engine(url)
+        return engine
+
+    yield _get
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def sqlite_source_url(tmp_path_factory, engine_for):
+    """Создаёт source SQLite базу во временном файле один раз на сессию.
+
+    Ни один тест не меняет source (corrector его только читает), поэтому
+    эталонная схема строится однажды, а не перед каждым тестом.
     """
-    src_path = tmp_path / 'source.db'
-    tgt_path = tmp_path / 'target.db'
-    return f'sqlite:///{src_path}', f'sqlite:///{tgt_path}'
+    src_path = tmp_path_factory.mktemp('sqlite') / 'source.db'
+    src_url = f'sqlite:///{src_path}'
+    _create_source_schema(engine_for(src_url))
+    return src_url
 
 
 @pytest.fixture()
-def prepared_dbs(db_urls):
-    """Создаёт source/target SQLite базы и возвращает их DSN."""
-    src_url, tgt_url = db_urls
-    src_engine = create_engine(src_url)
-    tgt_engine = create_engine(tgt_url)
+def sqlite_target_engine(tmp_path: Path):
+    """Создаёт свежую target SQLite базу и Engine к ней на время теста.
 
-    _create_source_schema(src_engine)
-    _create_target_schema(tgt_engine)
+    DSN у каждого теста уникален, поэтому Engine закрывается вместе с
+    тестом, а не копится в engine_for до конца сессии.
 
-    src_engine.dispose()
-    tgt_engine.dispose()
-
-    return src_url, tgt_url
+    Yields:
+        Engine: Engine target базы.
+    """
+    engine = create_test_engine(f'sqlite:///{tmp_path / "target.db"}')
+    _create_target_schema(engine)
+    yield engine
+    engine.dispose()
 
 
 @pytest.fixture()
+def prepared_dbs(sqlite_source_url, sqlite_target_engine):
+    """Возвращает DSN source/target SQLite баз.
+
+    Базы файловые, поэтому SchemaCorrector работает с ними через QueuePool
+    с рабочими настройками пула. Проверки теста по target идут через
+    sqlite_target_engine.
+    """
+    return (
+        sqlite_source_url,
+        sqlite_target_engine.url.render_as_string(),
+    )
+
+
+@pytest.fixture(scope='session')
 def postgres_urls():
     """Берёт DSN source/target Postgres из переменных окружения."""
     src_url = os.getenv('POSTGRES_SOURCE_URL')
@@ -54,37 +103,146 @@ def postgres_urls():
     return src_url, tgt_url
 
 
-@pytest.fixture()
-def prepared_postgres_dbs(postgres_urls):
-    """Создаёт временную схему в двух Postgres БД и наполняет её.
+def _in_schema(engine, schema: str):
+    """Возвращает Engine, в котором таблицы без схемы попадают в schema."""
+    return engine.execution_options(schema_translate_map={None: schema})
+
+
+def _rebuild_schema(engine, schema: str, md) -> None:
+    """Пересоздаёт схему в одной Postgres БД и строит в ней таблицы.
+
+    DROP/CREATE SCHEMA, все CREATE TABLE/INDEX и наполнение уходят одним
+    скриптом (один запрос), как батчи в SchemaCorrector._execute_batch().
+
+    Args:
+        engine: Engine БД.
+        schema: Имя схемы.
+        md: _SOURCE_MD или _TARGET_MD.
+
+    Returns:
+        None.
+    """
+    script = (
+        f'DROP SCHEMA IF EXISTS "{schema}" CASCADE;\n'
+        f'CREATE SCHEMA "{schema}";\n'
+        f'SET LOCAL search_path TO "{schema}";\n'
+        + _create_script(md, engine.dialect)
+    )
+    with engine.begin() as conn:
+        conn.execution_options(no_parameters=True).exec_driver_sql(script)
+
+
+def _drop_schema(engine, schema: str) -> None:
+    """Удаляет схему со всем содержимым."""
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+
+
+def _build_postgres_schema(src_engine, tgt_engine, schema: str) -> None:
+    """Пересоздаёт схему в обеих Postgres БД и строит в ней эталон/target.
+
+    Базы независимы, поэтому source и target строятся одновременно в двух
+    потоках (как каталоги в SchemaCorrector._load_catalogs()).
+
+    Args:
+        src_engine: Engine source БД.
+        tgt_engine: Engine target БД.
+        schema: Имя схемы.
+
+    Returns:
+        None.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        src_future = pool.submit(
+            _rebuild_schema, src_engine, schema, _SOURCE_MD
+        )
+        tgt_future = pool.submit(
+            _rebuild_schema, tgt_engine, schema, _TARGET_MD
+        )
+        src_future.result()
+        tgt_future.result()
+
+
+def _catalog_tokens(src_engine, tgt_engine, schema: str) -> tuple[str, ...]:
+    """Возвращает токены версии каталога схемы в source и target.
+
+    Токен меняется при любом DDL в схеме (см. corrector.pg_catalog_version).
+
+    Args:
+        src_engine: Engine source БД.
+        tgt_engine: Engine target БД.
+        schema: Имя схемы.
+
+    Returns:
+        tuple[str, ...]: (токен source, токен target).
+    """
+    tokens = []
+    for engine in (src_engine, tgt_engine):
+        with engine.connect() as conn:
+            tokens.append(pg_catalog_version(conn, schema))
+    return tuple(tokens)
+
+
+@pytest.fixture(scope='session')
+def postgres_schema(postgres_urls, engine_for):
+    """Создаёт одну временную схему в двух Postgres БД на всю сессию.
 
     Yields:
-        tuple[str, str, str]: (source_url, target_url, schema_name)
+        dict: {'schema': имя схемы, 'tokens': токены каталога после
+        последнего сброса}.
     """
     src_url, tgt_url = postgres_urls
     schema = f'corr_test_{uuid.uuid4().hex[:10]}'
-
-    src_engine = create_engine(src_url)
-    tgt_engine = create_engine(tgt_url)
+    src_engine = engine_for(src_url)
+    tgt_engine = engine_for(tgt_url)
 
     try:
-        with src_engine.begin() as conn:
-            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
-        with tgt_engine.begin() as conn:
-            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+        _build_postgres_schema(src_engine, tgt_engine, schema)
     except Exception as exc:
-        src_engine.dispose()
-        tgt_engine.dispose()
         pytest.skip(f'Cannot create schema for tests: {exc}')
 
+    state = {
+        'schema': schema,
+        'tokens': _catalog_tokens(src_engine, tgt_engine, schema),
+    }
     try:
-        _create_source_schema(src_engine, schema=schema)
-        _create_target_schema(tgt_engine, schema=schema)
-        yield src_url, tgt_url, schema
+        yield state
     finally:
-        with src_engine.begin() as conn:
-            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
-        with tgt_engine.begin() as conn:
-            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
-        src_engine.dispose()
-        tgt_engine.dispose()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [
+                pool.submit(_drop_schema, engine, schema)
+                for engine in (src_engine, tgt_engine)
+            ]:
+                future.result()
+
+
+@pytest.fixture()
+def prepared_postgres_dbs(postgres_urls, postgres_schema, engine_for):
+    """Возвращает исходное состояние общей схемы в двух Postgres БД.
+
+    Если предыдущий тест менял DDL (токен каталога изменился), схема
+    пересоздаётся целиком; иначе только сбрасываются данные target
+    (TRUNCATE + исходные строки), что заметно дешевле DROP/CREATE.
+
+    Yields:
+        tuple[str, str, str]: (source_url, target_url, schema_name)
+    """
+    src_url, tgt_url = postgres_urls
+    schema = postgres_schema['schema']
+    src_engine = engine_for(src_url)
+    tgt_engine = engine_for(tgt_url)
+
+    if _catalog_tokens(src_engine, tgt_engine, schema) == (
+        postgres_schema['tokens']
+    ):
+        with _in_schema(tgt_engine, schema).begin() as conn:
+            conn.execute(text(
+                f'TRUNCATE "{schema}"."users", "{schema}"."notes"'
+            ))
+            _seed_target_data(conn)
+    else:
+        _build_postgres_schema(src_engine, tgt_engine, schema)
+
+    # TRUNCATE тоже обновляет pg_class, поэтому токен берётся заново.
+    postgres_schema['tokens'] = _catalog_tokens(src_engine, tgt_engine, schema)
+    yield src_url, tgt_url, schema
@@ -4,59 +4,59 @@ import logging
 
 import pytest
 from sqlalchemy import (
-    create_engine,
     inspect,
     text,
 )
 
 from corrector import Operation, SchemaCorrector
+from tests._helpers.sqlite_engine import create_test_engine
 
 pytestmark = [pytest.mark.integration, pytest.mark.sqlite]
 
 
-def _reflect_tables(engine):
+def _reflect_tables(bind):
     """Возвращает набор имён таблиц в базе данных.
 
     Args:
-        engine: SQLAlchemy Engine, подключённый к БД.
+        bind: SQLAlchemy Engine или Inspector (кэширует рефлексию).
 
     Returns:
         set[str]: Множество имён таблиц.
     """
-    insp = inspect(engine)
+    insp = inspect(bind)
     return set(insp.get_table_names())
 
 
-def _reflect_columns(engine, table_name: str):
+def _reflect_columns(bind, table_name: str):
     """Возвращает набор имён колонок для указанной таблицы.
 
     Args:
-        engine: SQLAlchemy Engine, подключённый к БД.
+        bind: SQLAlchemy Engine или Inspector (кэширует рефлексию).
         table_name: Имя таблицы.
 
     Returns:
         set[str]: Множество имён колонок.
     """
-    insp = inspect(engine)
+    insp = inspect(bind)
     return {c['name'] for c in insp.get_columns(table_name)}
 
 
 def _is_nullable(
-    engine,
+    bind,
     table_name: str,
     column_name: str
 ) -> bool:
     """Проверяет, допускает ли колонка NULL.
 
     Args:
-        engine: SQLAlchemy Engine, подключённый к БД.
+        bind: SQLAlchemy Engine или Inspector (кэширует рефлексию).
         table_name: Имя таблицы.
         column_name: Имя колонки.
 
     Returns:
         bool: True, если колонка nullable, иначе False.
     """
-    insp = inspect(engine)
+    insp = inspect(bind)
     cols = insp.get_columns(table_name)
     col = next(c for c in cols if c['name'] == column_name)
     return bool(col.get('nullable', True))
@@ -121,6 +121,7 @@ def test_diff_plans_create_missing_table_and_column_and_reports_risks(
         target_url=tgt_url,
         lock_timeout_seconds=0,
         statement_timeout_seconds=0,
+        engine_factory=create_test_engine,
     )
 
     caplog.set_level(logging.WARNING)
@@ -161,7 +162,11 @@ def test_diff_plans_create_missing_table_and_column_and_reports_risks(
 
 
 @pytest.mark.dry_run
-def test_apply_dry_run_does_not_modify_target(prepared_dbs, capsys):
+def test_apply_dry_run_does_not_modify_target(
+    prepared_dbs,
+    capsys,
+    sqlite_target_engine
+):
     """Проверяет, что dry_run не изменяет целевую БД.
 
     Метод apply(..., dry_run=True) должен:
@@ -172,6 +177,7 @@ def test_apply_dry_run_does_not_modify_target(prepared_dbs, capsys):
     Args:
         prepared_dbs: Фикстура с DSN source/target БД.
         capsys: Pytest-фикстура для перехвата stdout/stderr.
+        sqlite_target_engine: Engine target БД.
     """
     src_url, tgt_url = prepared_dbs
 
@@ -180,6 +186,7 @@ def test_apply_dry_run_does_not_modify_target(prepared_dbs, capsys):
         target_url=tgt_url,
         lock_timeout_seconds=0,
         statement_timeout_seconds=0,
+        engine_factory=create_test_engine,
     )
 
     ops = corrector.diff()
@@ -188,16 +195,20 @@ def test_apply_dry_run_does_not_modify_target(prepared_dbs, capsys):
     out = capsys.readouterr().out
     assert 'ALTER TABLE' in out or 'CREATE TABLE' in out
 
-    tgt_engine = create_engine(tgt_url)
+    tgt_engine = sqlite_target_engine
+    insp = inspect(tgt_engine)
 
-    assert 'orders' not in _reflect_tables(tgt_engine)
-    assert 'age' not in _reflect_columns(tgt_engine, 'users')
+    assert 'orders' not in _reflect_tables(insp)
+    assert 'age' not in _reflect_columns(insp, 'users')
 
     assert _count_rows(tgt_engine, 'notes') == 1
     assert _get_user_legacy(tgt_engine, 1) == 'keep-me'
 
 
-def test_apply_executes_safe_ops_and_preserves_data_constraints(prepared_dbs):
+def test_apply_executes_safe_ops_and_preserves_data_constraints(
+    prepared_dbs,
+    sqlite_target_engine
+):
     """Проверяет применение безопасных операций и сохранность данных.
 
     Применяем только операции, которые не являются report. После apply():
@@ -210,6 +221,7 @@ def test_apply_executes_safe_ops_and_preserves_data_constraints(prepared_dbs):
 
     Args:
         prepared_dbs: Фикстура с DSN source/target БД.
+        sqlite_target_engine: Engine target БД.
     """
     src_url, tgt_url = prepared_dbs
 
@@ -218,6 +230,7 @@ def test_apply_executes_safe_ops_and_preserves_data_constraints(prepared_dbs):
         target_url=tgt_url,
         lock_timeout_seconds=0,
         statement_timeout_seconds=0,
+        engine_factory=create_test_engine,
     )
 
     ops = corrector.diff()
@@ -225,15 +238,16 @@ def test_apply_executes_safe_ops_and_preserves_data_constraints(prepared_dbs):
 
     corrector.apply(safe_ops, dry_run=False)
 
-    tgt_engine = create_engine(tgt_url)
+    tgt_engine = sqlite_target_engine
+    insp = inspect(tgt_engine)
 
-    indexes = inspect(tgt_engine).get_indexes('users')
-    order_indexes = inspect(tgt_engine).get_indexes('orders')
-    order_fks = inspect(tgt_engine).get_foreign_keys('orders')
+    indexes = insp.get_indexes('users')
+    order_indexes = insp.get_indexes('orders')
+    order_fks = insp.get_foreign_keys('orders')
 
-    assert 'orders' in _reflect_tables(tgt_engine)
+    assert 'orders' in _reflect_tables(insp)
 
-    assert 'age' in _reflect_columns(tgt_engine, 'users')
+    assert 'age' in _reflect_columns(insp, 'users')
 
     assert any(
         fk.get('referred_table') == 'users'
@@ -242,13 +256,13 @@ def test_apply_executes_safe_ops_and_preserves_data_constraints(prepared_dbs):
         for fk in order_fks
     )
 
-    assert _is_nullable(tgt_engine, 'users', 'email') is True
+    assert _is_nullable(insp, 'users', 'email') is True
 
     assert any(i.get('name') == 'ix_users_email' for i in indexes)
     assert any(i.get('name') == 'ix_orders_user_id' for i in order_indexes)
 
-    assert 'notes' in _reflect_tables(tgt_engine)
-    assert 'legacy' in _reflect_columns(tgt_engine, 'users')
+    assert 'notes' in _reflect_tables(insp)
+    assert 'legacy' in _reflect_columns(insp, 'users')
 
     assert _count_rows(tgt_engine, 'notes') == 1
     assert _get_user_legacy(tgt_engine, 1) == 'keep-me'
@@ -273,6 +287,7 @@ def test_apply_logs_error_and_critical_on_failure(prepared_dbs, caplog):
         target_url=tgt_url,
         lock_timeout_seconds=0,
         statement_timeout_seconds=0,
+        engine_factory=create_test_engine,
     )
 
     caplog.set_level(logging.ERROR)
@@ -3,8 +3,9 @@ from __future__ import annotations
 import logging
 
 import pytest
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import event, inspect, text
 
+from catalog_cache import CatalogCache
 from corrector import Operation, SchemaCorrector
 
 
@@ -16,26 +17,26 @@ def _qualified(schema: str, table_name: str) -> str:
     return f'"{schema}"."{table_name}"'
 
 
-def _reflect_tables(engine, schema: str) -> set[str]:
-    """Возвращает множество таблиц в указанной схеме."""
-    insp = inspect(engine)
+def _reflect_tables(bind, schema: str) -> set[str]:
+    """Возвращает множество таблиц схемы (bind: Engine или Inspector)."""
+    insp = inspect(bind)
     return set(insp.get_table_names(schema=schema))
 
 
-def _reflect_columns(engine, schema: str, table_name: str) -> set[str]:
-    """Возвращает множество колонок таблицы в указанной схеме."""
-    insp = inspect(engine)
+def _reflect_columns(bind, schema: str, table_name: str) -> set[str]:
+    """Возвращает множество колонок таблицы (bind: Engine или Inspector)."""
+    insp = inspect(bind)
     return {c['name'] for c in insp.get_columns(table_name, schema=schema)}
 
 
 def _is_nullable(
-    engine,
+    bind,
     schema: str,
     table_name: str,
     column_name: str
 ) -> bool:
-    """Проверяет nullable колонки (с учётом схемы)."""
-    insp = inspect(engine)
+    """Проверяет nullable колонки (bind: Engine или Inspector)."""
+    insp = inspect(bind)
     cols = insp.get_columns(table_name, schema=schema)
     col = next(c for c in cols if c['name'] == column_name)
     return bool(col.get('nullable', True))
@@ -108,7 +109,11 @@ def test_diff_plans_expected_ops_and_reports(prepared_postgres_dbs, caplog):
 
 
 @pytest.mark.dry_run
-def test_apply_dry_run_does_not_modify_target(prepared_postgres_dbs, capsys):
+def test_apply_dry_run_does_not_modify_target(
+    prepared_postgres_dbs,
+    capsys,
+    engine_for
+):
     """Проверяет, что dry_run не меняет PostgreSQL target."""
     src_url, tgt_url, schema = prepared_postgres_dbs
 
@@ -126,15 +131,19 @@ def test_apply_dry_run_does_not_modify_target(prepared_postgres_dbs, capsys):
     out = capsys.readouterr().out
     assert 'ALTER TABLE' in out or 'CREATE TABLE' in out
 
-    tgt_engine = create_engine(tgt_url)
-    assert 'orders' not in _reflect_tables(tgt_engine, schema)
-    assert 'age' not in _reflect_columns(tgt_engine, schema, 'users')
+    tgt_engine = engine_for(tgt_url)
+    insp = inspect(tgt_engine)
+    assert 'orders' not in _reflect_tables(insp, schema)
+    assert 'age' not in _reflect_columns(insp, schema, 'users')
 
     assert _count_rows(tgt_engine, schema, 'notes') == 1
     assert _get_user_legacy(tgt_engine, schema, 1) == 'keep-me'
 
 
-def test_apply_executes_safe_ops_and_preserves_data(prepared_postgres_dbs):
+def test_apply_executes_safe_ops_and_preserves_data(
+    prepared_postgres_dbs,
+    engine_for
+):
     """Проверяет применение safe-операций и сохранность данных в Postgres."""
     src_url, tgt_url, schema = prepared_postgres_dbs
 
@@ -151,14 +160,15 @@ def test_apply_executes_safe_ops_and_preserves_data(prepared_postgres_dbs):
 
     corrector.apply(safe_ops, dry_run=False)
 
-    tgt_engine = create_engine(tgt_url)
+    tgt_engine = engine_for(tgt_url)
+    insp = inspect(tgt_engine)
 
-    assert 'orders' in _reflect_tables(tgt_engine, schema)
-    assert 'age' in _reflect_columns(tgt_engine, schema, 'users')
+    assert 'orders' in _reflect_tables(insp, schema)
+    assert 'age' in _reflect_columns(insp, schema, 'users')
 
-    order_fks = inspect(tgt_engine).get_foreign_keys('orders', schema=schema)
+    order_fks = insp.get_foreign_keys('orders', schema=schema)
 
-    assert _is_nullable(tgt_engine, schema, 'users', 'email') is True
+    assert _is_nullable(insp, schema, 'users', 'email') is True
 
     assert any(
         fk.get('referred_table') == 'users'
@@ -167,14 +177,25 @@ def test_apply_executes_safe_ops_and_preserves_data(prepared_postgres_dbs):
         for fk in order_fks
     )
 
-    user_indexes = inspect(tgt_engine).get_indexes('users', schema=schema)
-    order_indexes = inspect(tgt_engine).get_indexes('orders', schema=schema)
+    with tgt_engine.connect() as conn:
+        not_validated = conn.execute(
+            text(
+                'SELECT count(*) FROM pg_catalog.pg_constraint '
+                'WHERE contype = \'f\' AND NOT convalidated '
+                'AND connamespace = CAST(:schema AS regnamespace)'
+            ),
+            {'schema': schema},
+        ).scalar()
+    assert not_validated == 0
+
+    user_indexes = insp.get_indexes('users', schema=schema)
+    order_indexes = insp.get_indexes('orders', schema=schema)
 
     assert any(i.get('name') == 'ix_users_email' for i in user_indexes)
     assert any(i.get('name') == 'ix_orders_user_id' for i in order_indexes)
 
-    assert 'notes' in _reflect_tables(tgt_engine, schema)
-    assert 'legacy' in _reflect_columns(tgt_engine, schema, 'users')
+    assert 'notes' in _reflect_tables(insp, schema)
+    assert 'legacy' in _reflect_columns(insp, schema, 'users')
 
     assert _count_rows(tgt_engine, schema, 'notes') == 1
     assert _get_user_legacy(tgt_engine, schema, 1) == 'keep-me'
@@ -209,3 +230,444 @@ def test_apply_logs_error_and_critical_on_failure(
     assert any(
         'Schema correction aborted' in rec.message for rec in caplog.records
     )
+
+
+def test_catalog_cache_tracks_external_schema_changes(
+    prepared_postgres_dbs,
+    monkeypatch,
+    tmp_path,
+    engine_for
+):
+    """Проверяет catalog_cache на PostgreSQL: токен меняется после DDL."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=0,
+        statement_timeout_seconds=0,
+        catalog_cache=CatalogCache(tmp_path / 'cache'),
+    )
+
+    reads = []
+    load_catalog_postgres = corrector._load_catalog_postgres
+
+    def counting_loader(conn):
+        reads.append(conn.engine.url.database)
+        return load_catalog_postgres(conn)
+
+    monkeypatch.setattr(corrector, '_load_catalog_postgres', counting_loader)
+
+    first = corrector.diff()
+    assert len(reads) == 2
+
+    assert corrector.diff() == first
+    assert len(reads) == 2
+
+    tgt_engine = engine_for(tgt_url)
+    with tgt_engine.begin() as conn:
+        conn.execute(text(
+            f'ALTER TABLE {_qualified(schema, "users")} '
+            'ALTER COLUMN legacy SET DEFAULT \'n/a\''
+        ))
+
+    corrector.diff()
+    assert reads[2:] == [corrector.target_engine.url.database]
+
+
+def test_new_table_with_unique_constraint_is_created_once(
+    prepared_postgres_dbs,
+    engine_for
+):
+    """Проверяет, что индекс UNIQUE-ограничения не создаётся повторно."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    src_engine = engine_for(src_url)
+    with src_engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE TABLE {_qualified(schema, "tags")} ('
+            'id integer PRIMARY KEY, '
+            'name varchar(50) NOT NULL, '
+            'CONSTRAINT uq_tags_name UNIQUE (name))'
+        ))
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=0,
+        statement_timeout_seconds=0,
+    )
+
+    ops = corrector.diff()
+    assert not any(
+        op.kind == 'create_index' and 'uq_tags_name' in op.sql for op in ops
+    )
+
+    corrector.apply([op for op in ops if op.kind != 'report'], dry_run=False)
+
+    tgt_engine = engine_for(tgt_url)
+    uniques = inspect(tgt_engine).get_unique_constraints('tags', schema=schema)
+    assert [u['name'] for u in uniques] == ['uq_tags_name']
+
+
+def test_load_catalog_uses_single_connection(prepared_postgres_dbs, tmp_path):
+    """Проверяет, что токен и каталог читаются через одно соединение."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        catalog_cache=CatalogCache(tmp_path / 'cache'),
+    )
+
+    checkouts = []
+    event.listen(
+        corrector.target_engine,
+        'checkout',
+        lambda *args: checkouts.append(1),
+    )
+
+    catalog = corrector._load_catalog(corrector.target_engine)
+
+    assert {'users', 'notes'} <= catalog.tables
+    assert len(checkouts) == 1
+
+
+def test_dialect_specific_indexes_keep_their_options(
+    prepared_postgres_dbs,
+    engine_for
+):
+    """Проверяет, что partial/DESC/INCLUDE индексы переносятся целиком."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+    users = _qualified(schema, 'users')
+
+    src_engine = engine_for(src_url)
+    with src_engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE INDEX ix_users_email_partial ON {users} (email) '
+            'WHERE email IS NOT NULL'
+        ))
+        conn.execute(text(
+            f'CREATE INDEX ix_users_id_desc ON {users} (id DESC)'
+        ))
+        conn.execute(text(
+            f'CREATE INDEX ix_users_id_incl ON {users} (id) INCLUDE (email)'
+        ))
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=0,
+        statement_timeout_seconds=0,
+    )
+
+    ops = [
+        op for op in corrector.diff()
+        if op.kind == 'create_index' and 'ix_users_' in op.comment
+    ]
+    sql = {op.comment.removeprefix('Create index '): op.sql for op in ops}
+
+    assert 'WHERE' in sql['ix_users_email_partial']
+    assert 'DESC' in sql['ix_users_id_desc']
+    assert 'INCLUDE' in sql['ix_users_id_incl']
+
+    corrector.apply(ops, dry_run=False)
+
+    tgt_engine = engine_for(tgt_url)
+    with tgt_engine.connect() as conn:
+        defs = dict(conn.execute(
+            text(
+                'SELECT indexname, indexdef FROM pg_catalog.pg_indexes '
+                'WHERE schemaname = :schema AND tablename = \'users\''
+            ),
+            {'schema': schema},
+        ).all())
+
+    assert 'WHERE (email IS NOT NULL)' in defs['ix_users_email_partial']
+    assert '(id DESC)' in defs['ix_users_id_desc']
+    assert 'INCLUDE (email)' in defs['ix_users_id_incl']
+
+
+def test_failed_batch_is_retried_one_by_one(
+    prepared_postgres_dbs,
+    caplog,
+    engine_for
+):
+    """Проверяет, что упавший батч указывает на конкретную операцию."""
+    _, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=tgt_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=0,
+        statement_timeout_seconds=0,
+    )
+
+    good = (
+        f'ALTER TABLE {_qualified(schema, "users")} '
+        'ADD COLUMN nickname varchar(20);'
+    )
+    bad = f'ALTER TABLE {_qualified(schema, "missing")} ADD COLUMN x int;'
+    ops = [
+        Operation(kind='add_column', sql=good, comment='good'),
+        Operation(kind='add_column', sql=bad, comment='bad'),
+    ]
+
+    caplog.set_level(logging.WARNING)
+    with pytest.raises(Exception) as exc_info:
+        corrector.apply(ops, dry_run=False)
+
+    assert exc_info.value.statement == bad
+    assert any(
+        'retrying statements one by one' in rec.message
+        for rec in caplog.records
+    )
+
+    tgt_engine = engine_for(tgt_url)
+    assert 'nickname' not in _reflect_columns(tgt_engine, schema, 'users')
+
+
+def test_equal_schemas_skip_catalog_load(prepared_postgres_dbs, monkeypatch):
+    """Проверяет, что при равных отпечатках каталоги не читаются."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    same = SchemaCorrector(
+        source_url=tgt_url,
+        target_url=tgt_url,
+        schema=schema,
+    )
+
+    def no_catalogs():
+        raise AssertionError('catalogs must not be loaded')
+
+    monkeypatch.setattr(same, '_load_catalogs', no_catalogs)
+    assert same.diff() == []
+
+    different = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+    )
+    assert different._schema_fingerprint(different.source_engine) != (
+        different._schema_fingerprint(different.target_engine)
+    )
+    assert different.diff()
+
+
+def test_fingerprint_tracks_column_collation(
+    prepared_postgres_dbs,
+    engine_for
+):
+    """Проверяет, что различие только в collation не скрывается fast-skip."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    for url, collate in ((src_url, ''), (tgt_url, ' COLLATE "C"')):
+        with engine_for(url).begin() as conn:
+            conn.exec_driver_sql(
+                f'CREATE TABLE {_qualified(schema, "coll")} '
+                f'(name text{collate})'
+            )
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        include_tables=['coll'],
+    )
+    assert corrector._schema_fingerprint(corrector.source_engine) != (
+        corrector._schema_fingerprint(corrector.target_engine)
+    )
+
+    comments = [op.comment for op in corrector.diff()]
+    assert any(
+        c.startswith('RISKY: type mismatch coll.name') for c in comments
+    )
+
+
+def test_context_manager_pins_read_only_source(
+    prepared_postgres_dbs,
+    engine_for
+):
+    """Проверяет with на PostgreSQL: source read-only, одно соединение."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=1,
+        statement_timeout_seconds=1,
+    )
+
+    checkouts = []
+    event.listen(
+        corrector.target_engine.pool,
+        'checkout',
+        lambda *args: checkouts.append(1),
+    )
+
+    with corrector:
+        read_only = corrector._src_conn.exec_driver_sql(
+            'SHOW default_transaction_read_only'
+        ).scalar()
+        ops = [op for op in corrector.diff() if op.kind != 'report']
+        corrector.apply(ops, dry_run=False)
+
+    assert read_only == 'on'
+    assert len(checkouts) == 1
+    assert 'orders' in _reflect_tables(engine_for(tgt_url), schema)
+
+    with corrector.source_engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            'SHOW default_transaction_read_only'
+        ).scalar() == 'off'
+
+
+def test_table_filters_limit_postgres_catalog(prepared_postgres_dbs):
+    """Проверяет include/exclude_tables в запросах к pg_catalog."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        exclude_tables=['notes', 'orders'],
+    )
+
+    catalog = corrector._load_catalog(corrector.target_engine)
+    assert catalog.tables == frozenset({'users'})
+
+    comments = [op.comment for op in corrector.diff()]
+    assert 'Create table orders' not in comments
+    assert not any('notes' in c for c in comments)
+    assert 'Add column users.age' in comments
+
+    only_orders = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+        include_tables=['orders'],
+    )
+    assert only_orders._load_catalog(
+        only_orders.source_engine
+    ).tables == frozenset({'orders'})
+
+
+def test_postgres_catalog_types_match_inspector(
+    prepared_postgres_dbs,
+    engine_for
+):
+    """Проверяет, что type_sql из pg_catalog совпадает с Inspector."""
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    with engine_for(tgt_url).begin() as conn:
+        conn.exec_driver_sql(f'CREATE TYPE "{schema}".mood AS ENUM (\'ok\')')
+        conn.exec_driver_sql(
+            f'CREATE TABLE {_qualified(schema, "typed")} ('
+            'v varchar(255), ts timestamp, tz timestamptz(3), '
+            'n numeric(10, 2), d double precision, a integer[], '
+            't text COLLATE "C", iv interval day to second, '
+            f'm "{schema}".mood)'
+        )
+
+    corrector = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        schema=schema,
+    )
+    with corrector.target_engine.connect() as conn:
+        from_pg = corrector._load_catalog_postgres(conn)
+    from_insp = corrector._load_catalog_inspector(corrector.target_engine)
+
+    def types(catalog):
+        return {
+            table: {name: meta['type_sql'] for name, meta in cols.items()}
+            for table, cols in catalog.columns.items()
+        }
+
+    assert types(from_pg) == types(from_insp)
+    assert types(from_pg)['typed']['v'] == 'VARCHAR(255)'
+
+
+@pytest.mark.parametrize('fast_equal_skip', [True, False])
+def test_apply_rejects_plan_built_before_concurrent_change(
+    prepared_postgres_dbs,
+    monkeypatch,
+    fast_equal_skip
+):
+    """Проверяет, что устаревший план не применяется после чужого apply().
+
+    Без fast_equal_skip diff() не читает отпечаток target, и apply()
+    сверяет каталог со снимком, по которому строился план.
+    """
+    src_url, tgt_url, schema = prepared_postgres_dbs
+
+    first, second = (
+        SchemaCorrector(
+            source_url=src_url,
+            target_url=tgt_url,
+            schema=schema,
+            lock_timeout_seconds=0,
+            statement_timeout_seconds=0,
+            fast_equal_skip=fast_equal_skip,
+        )
+        for _ in range(2)
+    )
+    if not fast_equal_skip:
+        def no_fingerprint(engine):
+            raise AssertionError('fingerprint must not be read')
+
+        monkeypatch.setattr(first, '_schema_fingerprint', no_fingerprint)
+
+    stale_ops = first.diff()
+    second.apply(second.diff(), dry_run=False)
+
+    with pytest.raises(RuntimeError, match='Target schema changed'):
+        first.apply(stale_ops, dry_run=False)
+
+    first.apply(first.diff(), dry_run=False)
+    assert all(op.kind == 'report' for op in first.diff())
+
+
+def test_batch_lock_timeout_is_not_retried(
+    prepared_postgres_dbs,
+    caplog,
+    engine_for
+):
+    """Проверяет, что батч, упавший по lock_timeout, не повторяется."""
+    _, tgt_url, schema = prepared_postgres_dbs
+
+    corrector = SchemaCorrector(
+        source_url=tgt_url,
+        target_url=tgt_url,
+        schema=schema,
+        lock_timeout_seconds=1,
+        statement_timeout_seconds=0,
+    )
+    users = _qualified(schema, 'users')
+    ops = [
+        Operation(
+            kind='add_column',
+            sql=f'ALTER TABLE {users} ADD COLUMN {name} int;',
+            comment=name,
+        )
+        for name in ('a1', 'a2')
+    ]
+
+    caplog.set_level(logging.WARNING)
+    with engine_for(tgt_url).connect() as holder:
+        holder.exec_driver_sql(f'LOCK TABLE {users} IN ACCESS EXCLUSIVE MODE')
+        with pytest.raises(Exception) as exc_info:
+            corrector.apply(ops, dry_run=False)
+        holder.rollback()
+
+    assert exc_info.value.orig.pgcode == '55P03'
+    assert not any(
+        'retrying statements one by one' in rec.message
+        for rec in caplog.records
+    )
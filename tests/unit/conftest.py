@@ -6,34 +6,48 @@ from pathlib import Path
 import pytest
 
 from corrector import SchemaCorrector
+from tests._helpers.sqlite_engine import create_test_engine
 
 
 @pytest.fixture()
 def sqlite_urls(tmp_path: Path) -> tuple[str, str]:
-    """Возвращает DSN для двух SQLite баз во временной директории."""
+    """Возвращает DSN для двух SQLite баз во временной директории.
+
+    Файловые базы обслуживаются QueuePool, как и в рабочем запуске, поэтому
+    тесты видят те же ограничения пула.
+    """
     src = tmp_path / 'src_unit.db'
     tgt = tmp_path / 'tgt_unit.db'
     return f'sqlite:///{src}', f'sqlite:///{tgt}'
 
 
 @pytest.fixture()
-def make_corrector(sqlite_urls) -> Callable[..., SchemaCorrector]:
-    """Фабрика SchemaCorrector для unit-тестов."""
-    src_url, tgt_url = sqlite_urls
-
-    def _make(**kwargs) -> SchemaCorrector:
-        return SchemaCorrector(
-            source_url=kwargs.pop('source_url', src_url),
-            target_url=kwargs.pop('target_url', tgt_url),
-            schema=kwargs.pop('schema', None),
-            lock_timeout_seconds=kwargs.pop('lock_timeout_seconds', 0),
-            statement_timeout_seconds=kwargs.pop(
-                'statement_timeout_seconds',
-                0
-            ),
-            allow_destructive=kwargs.pop('allow_destructive', False),
-            logger=kwargs.pop('logger', None),
-        )
+def make_corrector() -> Callable[..., SchemaCorrector]:
+    """Фабрика SchemaCorrector для unit-тестов.
+
+    По умолчанию source и target — SQLite в памяти ('sqlite://'): тестам,
+    которые проверяют планирование и SQL по готовым данным, база не нужна,
+    и pytest не создаёт для них tmp_path. Тесты, которые строят таблицы
+    или зависят от пула (QueuePool файловой базы), передают DSN из
+    sqlite_urls: make_corrector(*sqlite_urls).
+
+    Engine создаются через create_test_engine() (PRAGMA без fsync и
+    файлового журнала). Любые аргументы конструктора (schema,
+    engine_factory, parallel_introspection, ...) передаются как есть.
+    """
+
+    def _make(
+        source_url: str = 'sqlite://',
+        target_url: str = 'sqlite://',
+        **kwargs
+    ) -> SchemaCorrector:
+        options = {
+            'source_url': source_url,
+            'target_url': target_url,
+            'engine_factory': create_test_engine,
+        }
+        options.update(kwargs)
+        return SchemaCorrector(**options)
 
     return _make
 
@@ -54,12 +68,7 @@ def non_sqlite_corrector(make_corrector, monkeypatch) -> SchemaCorrector:
 
 @pytest.fixture()
 def postgres_dialect_corrector(make_corrector, monkeypatch) -> SchemaCorrector:
-    """Corrector с postgres dialect.name, без реального PostgreSQL."""
+    """Corrector с postgres-диалектом target, без реального PostgreSQL."""
     c = make_corrector(lock_timeout_seconds=2, statement_timeout_seconds=3)
-    monkeypatch.setattr(
-        c.target_engine.dialect,
-        'name',
-        'postgresql',
-        raising=False
-    )
+    monkeypatch.setattr(c, '_target_dialect', 'postgresql')
     return c
@@ -1,86 +1,123 @@
 from __future__ import annotations
 
+import threading
+from pathlib import Path
 from unittest.mock import Mock
 
 import pytest
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
     Integer,
     MetaData,
     Table,
     create_engine,
+    event,
     inspect,
+    make_url,
     String
 )
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Inspector
 
 import corrector as corrector_mod
+from catalog_cache import CatalogCache
 from corrector import Operation, SchemaCorrector
 
 
 pytestmark = [pytest.mark.unit]
 
 
-def test_sort_missing_tables_by_fk_detects_cycle_and_falls_back(
+def test_sort_missing_tables_by_fk_orders_around_cycle(
     caplog,
-    tmp_path
+    make_corrector
 ):
-    """Проверяет fallback-поведение при цикле FK-зависимостей."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
+    """Проверяет частичный порядок при цикле FK-зависимостей."""
+    c = make_corrector()
+
+    # a -> b, b -> a (цикл); d зависит от цикла; c вне цикла
+    src_fks = {
+        'a': [{'referred_table': 'b'}],
+        'b': [{'referred_table': 'a'}],
+        'c': [],
+        'd': [{'referred_table': 'a'}],
+    }
 
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema=None)
+    caplog.set_level('WARNING')
+    missing = ['d', 'a', 'b', 'c']
 
-    class FakeInspector:
-        def get_foreign_keys(self, table_name: str, schema=None):
-            # a -> b, b -> a (цикл)
-            if table_name == 'a':
-                return [{'referred_table': 'b'}]
-            if table_name == 'b':
-                return [{'referred_table': 'a'}]
-            return []
+    out = c._sort_missing_tables_by_fk(src_fks, missing)
 
-    caplog.set_level('WARNING')
-    missing = ['a', 'b']
+    assert out == ['c', 'a', 'b', 'd']
+    messages = [
+        rec.getMessage() for rec in caplog.records
+        if 'cycle detected' in rec.getMessage()
+    ]
+    assert len(messages) == 1
+    assert '(nodes=a, b)' in messages[0]
+
+
+def test_sort_missing_tables_by_fk_ignores_self_references(
+    caplog,
+    corrector
+):
+    """Проверяет, что FK таблицы на саму себя не считается циклом."""
+    src_fks = {
+        'employees': [{'referred_table': 'employees'}],
+        'orders': [{'referred_table': 'employees'}],
+    }
 
-    out = c._sort_missing_tables_by_fk(FakeInspector(), missing)
+    caplog.set_level('WARNING')
+    out = corrector._sort_missing_tables_by_fk(
+        src_fks,
+        ['orders', 'employees']
+    )
 
-    assert out == missing
-    assert any('cycle detected' in rec.message for rec in caplog.records)
+    assert out == ['employees', 'orders']
+    assert not caplog.records
+    assert corrector._sort_missing_tables_by_fk(src_fks, ['employees']) == [
+        'employees'
+    ]
 
 
-def test_apply_timeouts_sets_lock_and_statement_for_postgres(tmp_path):
+def test_apply_timeouts_sets_lock_and_statement_for_postgres(make_corrector):
     """Проверяет, что _apply_timeouts выставляет SET для PostgreSQL."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
+    c = make_corrector(lock_timeout_seconds=2, statement_timeout_seconds=3)
 
-    c = SchemaCorrector(
-        source_url=src,
-        target_url=tgt,
-        lock_timeout_seconds=2,
-        statement_timeout_seconds=3,
+    c._target_dialect = 'postgresql'
+
+    conn = Mock()
+    c._apply_timeouts(conn)
+
+    conn.exec_driver_sql.assert_called_once()
+    assert conn.exec_driver_sql.call_args.args[0] == (
+        "SET LOCAL lock_timeout = '2s'; SET LOCAL statement_timeout = '3s'"
     )
 
-    c.target_engine.dialect.name = 'postgresql'
+
+def test_apply_timeouts_skips_zero_timeouts(make_corrector):
+    """Проверяет, что нулевые таймауты не отправляются на сервер."""
+    c = make_corrector(lock_timeout_seconds=5, statement_timeout_seconds=0)
+    c._target_dialect = 'postgresql'
 
     conn = Mock()
     c._apply_timeouts(conn)
+    assert conn.exec_driver_sql.call_args.args[0] == (
+        "SET LOCAL lock_timeout = '5s'"
+    )
 
-    assert conn.execute.call_count == 2
-    lock_call = conn.execute.call_args_list[0].args[0]
-    stmt_call = conn.execute.call_args_list[1].args[0]
-
-    assert lock_call.text == "SET lock_timeout = '2s'"
-    assert stmt_call.text == "SET statement_timeout = '3s'"
+    c.lock_timeout_seconds = 0
+    conn = Mock()
+    c._apply_timeouts(conn)
+    conn.exec_driver_sql.assert_not_called()
 
 
-def test_build_fk_operation_none_when_insufficient_data(tmp_path):
+def test_build_fk_operation_none_when_insufficient_data(make_corrector):
     """
     Проверяет, что _build_fk_operation возвращает None при нехватке данных.
     """
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema='corr_manual')
+    c = make_corrector(schema='corr_manual')
 
     assert c._build_fk_operation('orders', {}) is None
     assert c._build_fk_operation('orders', {'referred_table': 'users'}) is None
@@ -90,13 +127,11 @@ def test_build_fk_operation_none_when_insufficient_data(tmp_path):
     ) is None
 
 
-def test_build_fk_operation_includes_options_and_not_valid(tmp_path):
+def test_build_fk_operation_includes_options_and_not_valid(make_corrector):
     """Проверяет генерацию SQL для FK: ON DELETE/UPDATE и NOT VALID для PG."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema='corr_manual')
+    c = make_corrector(schema='corr_manual')
 
-    c.target_engine.dialect.name = 'postgresql'
+    c._target_dialect = 'postgresql'
 
     fk = {
         'name': None,
@@ -116,11 +151,9 @@ def test_build_fk_operation_includes_options_and_not_valid(tmp_path):
     assert 'REFERENCES' in op.sql
 
 
-def test_make_fk_name_truncates_to_60(tmp_path):
+def test_make_fk_name_truncates_to_60(make_corrector):
     """Проверяет, что _make_fk_name ограничивает длину имени FK до 60."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
+    c = make_corrector()
 
     fk = {
         'constrained_columns': ['col_' + 'x' * 50],
@@ -131,10 +164,28 @@ def test_make_fk_name_truncates_to_60(tmp_path):
     assert len(name) <= 60
 
 
-def test_plan_create_table_can_exclude_foreign_keys(tmp_path):
+def test_engines_are_created_on_first_use(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что Engine создаются только при первом обращении."""
+    _, tgt = sqlite_urls
+    factory = Mock(wraps=create_engine)
+    c = make_corrector(*sqlite_urls, engine_factory=factory)
+
+    c._make_fk_name('orders', {'constrained_columns': ['user_id']})
+    factory.assert_not_called()
+
+    assert c.target_engine is c.target_engine
+    assert [call.args[0] for call in factory.call_args_list] == [tgt]
+
+
+def test_plan_create_table_can_exclude_foreign_keys(
+    sqlite_urls,
+    make_corrector
+):
     """Проверяет include_foreign_keys в _plan_create_table (SQLite-путь)."""
-    src_url = f'sqlite:///{tmp_path / "s.db"}'
-    tgt_url = f'sqlite:///{tmp_path / "t.db"}'
+    src_url, tgt_url = sqlite_urls
 
     src_engine = create_engine(src_url)
     tgt_engine = create_engine(tgt_url)
@@ -153,14 +204,14 @@ def test_plan_create_table_can_exclude_foreign_keys(tmp_path):
     )
     md.create_all(src_engine)
 
-    c = SchemaCorrector(source_url=src_url, target_url=tgt_url, schema=None)
+    c = make_corrector(*sqlite_urls)
 
     sql_no_fk = c._plan_create_table(
-        'orders',
+        c._src_table('orders'),
         include_foreign_keys=False
     )[0].sql
     sql_with_fk = c._plan_create_table(
-        'orders',
+        c._src_table('orders'),
         include_foreign_keys=True
     )[0].sql
 
@@ -171,12 +222,14 @@ def test_plan_create_table_can_exclude_foreign_keys(tmp_path):
     tgt_engine.dispose()
 
 
-def test_sqlite_reports_missing_fk_for_existing_table(tmp_path):
+def test_sqlite_reports_missing_fk_for_existing_table(
+    sqlite_urls,
+    make_corrector
+):
     """
     Проверяет sqlite-ветку: нельзя добавить FK через ALTER TABLE -> report.
     """
-    src_url = f'sqlite:///{tmp_path / "s.db"}'
-    tgt_url = f'sqlite:///{tmp_path / "t.db"}'
+    src_url, tgt_url = sqlite_urls
 
     src_engine = create_engine(src_url)
     tgt_engine = create_engine(tgt_url)
@@ -202,7 +255,7 @@ def test_sqlite_reports_missing_fk_for_existing_table(tmp_path):
     )
     md2.create_all(tgt_engine)
 
-    c = SchemaCorrector(source_url=src_url, target_url=tgt_url, schema=None)
+    c = make_corrector(*sqlite_urls)
     ops = c.diff()
 
     assert any(
@@ -215,10 +268,12 @@ def test_sqlite_reports_missing_fk_for_existing_table(tmp_path):
     tgt_engine.dispose()
 
 
-def test_report_risky_type_mismatch(tmp_path):
+def test_report_risky_type_mismatch(
+    sqlite_urls,
+    make_corrector
+):
     """Проверяет report по type mismatch (source vs target)."""
-    src_url = f'sqlite:///{tmp_path / "s.db"}'
-    tgt_url = f'sqlite:///{tmp_path / "t.db"}'
+    src_url, tgt_url = sqlite_urls
 
     src_engine = create_engine(src_url)
     tgt_engine = create_engine(tgt_url)
@@ -241,7 +296,7 @@ def test_report_risky_type_mismatch(tmp_path):
     )
     md2.create_all(tgt_engine)
 
-    c = SchemaCorrector(source_url=src_url, target_url=tgt_url, schema=None)
+    c = make_corrector(*sqlite_urls)
     ops = c.diff()
 
     assert any(
@@ -253,74 +308,115 @@ def test_report_risky_type_mismatch(tmp_path):
     tgt_engine.dispose()
 
 
-def test_plan_add_missing_indexes_falls_back_to_inspector(
+def test_plan_add_missing_indexes_builds_plain_index_from_catalog(
     monkeypatch,
-    tmp_path
+    make_corrector
 ):
-    """
-    Проверяет fallback по индексам: reflection пустой -> берём из inspector.
-    """
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema=None)
-
-    class FakeTargetInspector:
-        def get_indexes(self, table_name: str, schema=None):
-            raise RuntimeError('boom')
+    """Проверяет, что обычный индекс строится из снимка без reflection."""
+    c = make_corrector()
+
+    src_indexes = [
+        {
+            'name': 'ix_users_email_unique',
+            'column_names': ['email'],
+            'unique': True,
+        },
+        {'name': 'ix_users_id', 'column_names': ['id'], 'unique': False},
+    ]
 
-    class FakeSourceInspector:
-        def get_indexes(self, table_name: str, schema=None):
-            return [{
-                'name': 'ix_users_email_unique',
-                'column_names': ['email'],
-                'unique': True,
-            }]
+    def no_reflection(*args, **kwargs):
+        raise AssertionError('plain indexes must not reflect the table')
 
-    def fake_inspect(engine):
-        if engine is c.target_engine:
-            return FakeTargetInspector()
-        if engine is c.source_engine:
-            return FakeSourceInspector()
-        raise AssertionError('unexpected engine')
+    monkeypatch.setattr(c, '_src_table', no_reflection)
 
-    class FakeTable:
-        indexes = set()
+    ops = c._plan_add_missing_indexes(
+        'users',
+        src_indexes=src_indexes,
+        tgt_indexes=[{'name': 'ix_users_id'}],
+    )
 
-    def fake_table(*args, **kwargs):
-        return FakeTable()
+    assert len(ops) == 1
+    assert ops[0].kind == 'create_index'
+    assert ops[0].sql == (
+        'CREATE UNIQUE INDEX "ix_users_email_unique" ON "users" ("email");'
+    )
 
-    monkeypatch.setattr(corrector_mod, 'inspect', fake_inspect)
-    monkeypatch.setattr(corrector_mod, 'Table', fake_table)
 
-    ops = c._plan_add_missing_indexes('users')
+def test_plan_add_missing_indexes_compiles_dialect_specific_index(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что partial-индекс компилируется через CreateIndex."""
+    src, tgt = sqlite_urls
+
+    engine = create_engine(src)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)'
+        )
+        conn.exec_driver_sql(
+            'CREATE INDEX ix_users_email ON users (email) '
+            'WHERE email IS NOT NULL'
+        )
+    engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+    catalog = c._load_catalog(c.source_engine)
+
+    ops = c._plan_add_missing_indexes(
+        'users',
+        src_indexes=catalog.indexes['users'],
+        tgt_indexes=[],
+    )
 
     assert len(ops) == 1
-    assert ops[0].kind == 'create_index'
-    assert 'UNIQUE' in ops[0].sql
-    assert 'ix_users_email_unique' in ops[0].sql
+    assert 'WHERE email IS NOT NULL' in ops[0].sql
 
 
-def test_sort_missing_tables_by_fk_orders_after_users(caplog, tmp_path):
+def test_sort_missing_tables_by_fk_orders_after_users(
+    caplog,
+    make_corrector
+):
     """Проверяет сортировку недостающих таблиц по FK (без циклов)."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
+    c = make_corrector()
 
-    class FakeInspector:
-        def get_foreign_keys(self, table_name: str, schema=None):
-            if table_name == 'orders':
-                return [{'referred_table': 'users'}]
-            return []
+    src_fks = {'orders': [{'referred_table': 'users'}]}
 
-    out = c._sort_missing_tables_by_fk(FakeInspector(), ['users', 'orders'])
+    out = c._sort_missing_tables_by_fk(src_fks, ['users', 'orders'])
     assert out == ['users', 'orders']
 
 
-def test_apply_skips_report_ops_and_executes_sql(caplog, tmp_path):
+def test_sort_missing_tables_by_fk_orders_parents_first(corrector):
+    """Проверяет порядок «родитель раньше потомка» на цепочке и ромбе."""
+    src_fks = {
+        'items': [{'referred_table': 'orders'}],
+        'orders': [
+            {'referred_table': 'users'},
+            {'referred_table': 'shops'},
+        ],
+        'shops': [{'referred_table': 'users'}],
+        'users': [{'referred_table': 'countries'}],
+    }
+    missing = ['items', 'orders', 'shops', 'users', 'audit']
+
+    out = corrector._sort_missing_tables_by_fk(src_fks, missing)
+
+    assert sorted(out) == sorted(missing)
+    for child, fks in src_fks.items():
+        for fk in fks:
+            parent = fk['referred_table']
+            if parent in missing:
+                assert out.index(parent) < out.index(child)
+
+
+def test_apply_skips_report_ops_and_executes_sql(
+    caplog,
+    sqlite_urls,
+    make_corrector
+):
     """Проверяет, что apply() пропускает report-операции (ветка 287-288)."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
+    src, tgt = sqlite_urls
+    c = make_corrector(*sqlite_urls)
 
     ops = [
         Operation(kind='report', sql='-- no-op', comment='just a report'),
@@ -340,10 +436,12 @@ def test_apply_skips_report_ops_and_executes_sql(caplog, tmp_path):
     assert any('Skipping report op' in r.message for r in caplog.records)
 
 
-def test_diff_plans_fks_for_new_tables_when_not_sqlite(tmp_path):
+def test_diff_plans_fks_for_new_tables_when_not_sqlite(
+    sqlite_urls,
+    make_corrector
+):
     """Проверяет ветку diff(): FK для новых таблиц + планирование FK."""
-    src_url = f'sqlite:///{tmp_path / "src.db"}'
-    tgt_url = f'sqlite:///{tmp_path / "tgt.db"}'
+    src_url, tgt_url = sqlite_urls
 
     src_engine = create_engine(src_url)
     tgt_engine = create_engine(tgt_url)
@@ -362,7 +460,7 @@ def test_diff_plans_fks_for_new_tables_when_not_sqlite(tmp_path):
     Table('users', md_tgt, Column('id', Integer, primary_key=True))
     md_tgt.create_all(tgt_engine)
 
-    c = SchemaCorrector(source_url=src_url, target_url=tgt_url)
+    c = make_corrector(*sqlite_urls)
     c._is_sqlite = lambda: False
 
     ops = c.diff()
@@ -373,48 +471,53 @@ def test_diff_plans_fks_for_new_tables_when_not_sqlite(tmp_path):
     tgt_engine.dispose()
 
 
-def test_plan_add_foreign_keys_for_new_table_sqlite_returns_empty(tmp_path):
+def test_plan_add_foreign_keys_for_new_table_sqlite_returns_empty(
+    make_corrector
+):
     """Проверяет sqlite-ветку _plan_add_foreign_keys_for_new_table."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
+    c = make_corrector()
 
-    fake_src_insp = Mock()
-    fake_src_insp.get_foreign_keys.return_value = []
+    src_fks = [{
+        'referred_table': 'users',
+        'constrained_columns': ['user_id'],
+        'referred_columns': ['id'],
+        'options': {},
+    }]
 
-    ops = c._plan_add_foreign_keys_for_new_table(fake_src_insp, 'orders')
+    ops = c._plan_add_foreign_keys_for_new_table('orders', src_fks)
     assert ops == []
 
 
-def test_plan_add_foreign_keys_for_new_table_non_sqlite_builds_ops(tmp_path):
+def test_plan_add_foreign_keys_for_new_table_non_sqlite_builds_ops(
+    make_corrector
+):
     """
     Проверяет не-sqlite ветку _plan_add_foreign_keys_for_new_table.
     """
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
+    c = make_corrector()
 
     c._is_sqlite = lambda: False
 
-    fake_src_insp = Mock()
-    fake_src_insp.get_foreign_keys.return_value = [{
+    src_fks = [{
         'referred_table': 'users',
         'constrained_columns': ['user_id'],
         'referred_columns': ['id'],
         'options': {},
     }]
 
-    ops = c._plan_add_foreign_keys_for_new_table(fake_src_insp, 'orders')
+    ops = c._plan_add_foreign_keys_for_new_table('orders', src_fks)
     assert len(ops) == 1
     assert ops[0].kind == 'add_foreign_key'
 
 
-def test_plan_add_missing_foreign_keys_non_sqlite_success_path(tmp_path):
+def test_plan_add_missing_foreign_keys_non_sqlite_success_path(
+    sqlite_urls,
+    make_corrector
+):
     """
     Проверяет _plan_add_missing_foreign_keys не-sqlite ветку + _fk_signature.
     """
-    src_url = f'sqlite:///{tmp_path / "src_fk.db"}'
-    tgt_url = f'sqlite:///{tmp_path / "tgt_fk.db"}'
+    src_url, tgt_url = sqlite_urls
 
     src_engine = create_engine(src_url)
     tgt_engine = create_engine(tgt_url)
@@ -439,10 +542,17 @@ def test_plan_add_missing_foreign_keys_non_sqlite_success_path(tmp_path):
     )
     md_tgt.create_all(tgt_engine)
 
-    c = SchemaCorrector(source_url=src_url, target_url=tgt_url)
+    c = make_corrector(*sqlite_urls)
     c._is_sqlite = lambda: False
 
-    ops = c._plan_add_missing_foreign_keys('child')
+    src_catalog = c._load_catalog(c.source_engine)
+    tgt_catalog = c._load_catalog(c.target_engine)
+
+    ops = c._plan_add_missing_foreign_keys(
+        'child',
+        src_catalog.foreign_keys['child'],
+        tgt_catalog.foreign_keys['child'],
+    )
 
     assert len(ops) == 1
     assert ops[0].kind == 'add_foreign_key'
@@ -451,52 +561,125 @@ def test_plan_add_missing_foreign_keys_non_sqlite_success_path(tmp_path):
     tgt_engine.dispose()
 
 
-def test_plan_add_missing_fks_non_sqlite_exception_on_target_inspector(
+def test_load_catalog_tolerates_foreign_key_reflection_errors(
     monkeypatch,
-    tmp_path
+    caplog,
+    make_corrector
 ):
     """
-    Проверяет except-блок при падении target inspector.get_foreign_keys().
+    Проверяет except-блок при падении inspector.get_foreign_keys().
     """
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt)
-    c._is_sqlite = lambda: False
-
-    class FakeSourceInspector:
-        def get_foreign_keys(self, table_name: str, schema=None):
-            return [{
-                'referred_table': 'users',
-                'constrained_columns': ['user_id'],
-                'referred_columns': ['id'],
-                'options': {},
-            }]
+    c = make_corrector()
 
     class FakeTargetInspector:
+        def get_table_names(self, schema=None):
+            return ['orders']
+
+        def get_columns(self, table_name: str, schema=None):
+            return []
+
+        def get_indexes(self, table_name: str, schema=None):
+            return []
+
         def get_foreign_keys(self, table_name: str, schema=None):
             raise RuntimeError('boom')
 
-    def fake_inspect(engine):
-        if engine is c.source_engine:
-            return FakeSourceInspector()
-        if engine is c.target_engine:
-            return FakeTargetInspector()
-        raise AssertionError('unexpected engine')
+    monkeypatch.setattr(
+        corrector_mod,
+        'inspect',
+        lambda engine: FakeTargetInspector(),
+    )
 
-    monkeypatch.setattr(corrector_mod, 'inspect', fake_inspect)
+    caplog.set_level('WARNING')
+    catalog = c._load_catalog(c.target_engine)
 
-    ops = c._plan_add_missing_foreign_keys('orders')
-    assert len(ops) == 1
-    assert ops[0].kind == 'add_foreign_key'
+    assert catalog.tables == frozenset({'orders'})
+    assert catalog.foreign_keys['orders'] == []
+    assert any(
+        'Cannot reflect foreign keys' in rec.message for rec in caplog.records
+    )
+
+
+@pytest.mark.parametrize('parallel', [True, False])
+def test_diff_loads_each_catalog_once(
+    monkeypatch,
+    make_corrector,
+    parallel
+):
+    """Проверяет, что diff() читает каталог каждой БД ровно один раз."""
+    c = make_corrector(parallel_introspection=parallel)
+
+    calls = []
+    load_catalog = c._load_catalog
+
+    def counting_load_catalog(engine):
+        calls.append(engine)
+        return load_catalog(engine)
+
+    monkeypatch.setattr(c, '_load_catalog', counting_load_catalog)
+
+    c.diff()
+
+    assert len(calls) == 2
+    assert set(calls) == {c.source_engine, c.target_engine}
+
+
+def test_parallel_introspection_loads_catalogs_in_worker_threads(
+    monkeypatch,
+    make_corrector
+):
+    """Проверяет, что каталоги читаются в потоках introspect, не в main."""
+    c = make_corrector()
+
+    barrier = threading.Barrier(2, timeout=5)
+    threads = {}
+    load_catalog = c._load_catalog
+
+    def waiting_load_catalog(engine):
+        threads[engine] = threading.current_thread().name
+        # Оба чтения должны быть в работе одновременно, иначе барьер
+        # не пройдёт и тест упадёт по таймауту.
+        barrier.wait()
+        return load_catalog(engine)
+
+    monkeypatch.setattr(c, '_load_catalog', waiting_load_catalog)
+
+    c.diff()
+
+    assert len(threads) == 2
+    assert all(name.startswith('introspect') for name in threads.values())
+
+
+def test_diff_loads_shared_engine_catalog_once(monkeypatch, sqlite_urls):
+    """Проверяет, что общий Engine source/target читается один раз."""
+    url, _ = sqlite_urls
+    engine = create_engine(url)
+    c = SchemaCorrector(
+        source_url=url,
+        target_url=url,
+        engine_factory=lambda url, **options: engine,
+    )
+
+    calls = []
+    load_catalog = c._load_catalog
+
+    def counting_load_catalog(engine):
+        calls.append(engine)
+        return load_catalog(engine)
+
+    monkeypatch.setattr(c, '_load_catalog', counting_load_catalog)
+
+    assert c.diff() == []
+    assert calls == [c.source_engine]
+
+    engine.dispose()
 
 
 def test_build_fk_operation_without_schema_uses_unqualified_reference(
-    tmp_path
+    make_corrector
 ):
     """Проверяет ветку ref_schema=False (646): REFERENCES без schema."""
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema=None)
+    c = make_corrector()
 
     fk = {
         'referred_table': 'users',
@@ -510,65 +693,65 @@ def test_build_fk_operation_without_schema_uses_unqualified_reference(
     assert '."users"' not in op.sql
 
 
+def test_build_fk_operation_qualifies_reference_to_other_schema(
+    make_corrector
+):
+    """Проверяет REFERENCES в схему, отличную от схемы корректора."""
+    c = make_corrector(schema='app')
+
+    fk = {
+        'referred_table': 'users',
+        'referred_schema': 'auth',
+        'constrained_columns': ['user_id'],
+        'referred_columns': ['id'],
+    }
+
+    op = c._build_fk_operation('orders', fk)
+    assert op is not None
+    assert op.sql.startswith('ALTER TABLE "app"."orders"')
+    assert 'REFERENCES "auth"."users" ("id")' in op.sql
+
+
 def test_plan_add_missing_foreign_keys_reports_conflict_and_skips_add(
-    monkeypatch,
-    tmp_path,
+    make_corrector,
 ):
     """
     Проверяет: FK-конфликт -> report, без add_foreign_key для конфликтного FK.
     """
-    src = f'sqlite:///{tmp_path / "s.db"}'
-    tgt = f'sqlite:///{tmp_path / "t.db"}'
 
-    c = SchemaCorrector(source_url=src, target_url=tgt, schema='corr_fk_demo')
+    c = make_corrector(schema='corr_fk_demo')
     c._is_sqlite = lambda: False
 
-    class FakeSourceInspector:
-        def get_foreign_keys(self, table_name: str, schema=None):
-            assert table_name == 'orders'
-            return [
-                {
-                    'name': None,
-                    'referred_table': 'customers',
-                    'referred_schema': 'corr_fk_demo',
-                    'constrained_columns': ['user_id'],
-                    'referred_columns': ['id'],
-                    'options': {},
-                },
-                {
-                    'name': None,
-                    'referred_table': 'users',
-                    'referred_schema': 'corr_fk_demo',
-                    'constrained_columns': ['creator_id'],
-                    'referred_columns': ['id'],
-                    'options': {},
-                },
-            ]
+    src_fks = [
+        {
+            'name': None,
+            'referred_table': 'customers',
+            'referred_schema': 'corr_fk_demo',
+            'constrained_columns': ['user_id'],
+            'referred_columns': ['id'],
+            'options': {},
+        },
+        {
+            'name': None,
+            'referred_table': 'users',
+            'referred_schema': 'corr_fk_demo',
+            'constrained_columns': ['creator_id'],
+            'referred_columns': ['id'],
+            'options': {},
+        },
+    ]
+    tgt_fks = [
+        {
+            'name': 'orders_user_id_fkey',
+            'referred_table': 'users',
+            'referred_schema': 'corr_fk_demo',
+            'constrained_columns': ['user_id'],
+            'referred_columns': ['id'],
+            'options': {},
+        },
+    ]
 
-    class FakeTargetInspector:
-        def get_foreign_keys(self, table_name: str, schema=None):
-            assert table_name == 'orders'
-            return [
-                {
-                    'name': 'orders_user_id_fkey',
-                    'referred_table': 'users',
-                    'referred_schema': 'corr_fk_demo',
-                    'constrained_columns': ['user_id'],
-                    'referred_columns': ['id'],
-                    'options': {},
-                },
-            ]
-
-    def fake_inspect(engine):
-        if engine is c.source_engine:
-            return FakeSourceInspector()
-        if engine is c.target_engine:
-            return FakeTargetInspector()
-        raise AssertionError('unexpected engine')
-
-    monkeypatch.setattr(corrector_mod, 'inspect', fake_inspect)
-
-    ops = c._plan_add_missing_foreign_keys('orders')
+    ops = c._plan_add_missing_foreign_keys('orders', src_fks, tgt_fks)
 
     assert any(
         op.kind == 'report' and 'FK conflict' in op.comment for op in ops
@@ -579,3 +762,939 @@ def test_plan_add_missing_foreign_keys_reports_conflict_and_skips_add(
     assert any(
         op.kind == 'add_foreign_key' and 'creator_id' in op.sql for op in ops
     )
+
+
+def test_execute_batch_sends_single_script_for_postgres(
+    postgres_dialect_corrector
+):
+    """Проверяет, что для PostgreSQL батч уходит одним exec_driver_sql."""
+    conn = Mock()
+
+    postgres_dialect_corrector._execute_batch(
+        conn,
+        ['CREATE TABLE a (id int);', 'CREATE TABLE b (id int);'],
+    )
+
+    conn.execute.assert_not_called()
+    conn.exec_driver_sql.assert_called_once()
+    script = conn.exec_driver_sql.call_args.args[0]
+    assert script == (
+        'SAVEPOINT correction_db_batch;\n'
+        'CREATE TABLE a (id int);\n'
+        'CREATE TABLE b (id int);\n'
+        'RELEASE SAVEPOINT correction_db_batch;'
+    )
+
+
+def test_execute_batch_runs_statements_one_by_one_for_sqlite(corrector):
+    """Проверяет, что для SQLite операции батча выполняются по одной."""
+    conn = Mock()
+
+    corrector._execute_batch(
+        conn,
+        ['CREATE TABLE a (id int);', 'CREATE TABLE b (id int);'],
+    )
+
+    conn.execute.assert_not_called()
+    assert [c.args[0] for c in conn.exec_driver_sql.call_args_list] == [
+        'CREATE TABLE a (id int);',
+        'CREATE TABLE b (id int);',
+    ]
+
+
+def test_diff_reuses_cached_catalog_until_schema_changes(
+    monkeypatch,
+    tmp_path,
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет catalog_cache: повторный diff() не читает каталог из БД."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table('users', md, Column('id', Integer, primary_key=True))
+    md.create_all(src_engine)
+
+    c = make_corrector(
+        *sqlite_urls,
+        catalog_cache=CatalogCache(tmp_path / 'cache'),
+    )
+
+    reads = []
+    load_catalog_inspector = c._load_catalog_inspector
+
+    def counting_loader(engine):
+        reads.append(engine)
+        return load_catalog_inspector(engine)
+
+    monkeypatch.setattr(c, '_load_catalog_inspector', counting_loader)
+
+    first = c.diff()
+    assert len(reads) == 2
+
+    second = c.diff()
+    assert len(reads) == 2
+    assert second == first
+
+    c.apply(first, dry_run=False)
+    c.diff()
+    assert reads[2:] == [c.target_engine]
+
+    src_engine.dispose()
+
+
+def test_catalog_cache_stores_sqlite_partial_index(
+    tmp_path,
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет кэш снимка с частичным индексом SQLite (sqlite_where)."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    users = Table(
+        'users',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('email', String(50)),
+    )
+    Index(
+        'ix_users_email_set',
+        users.c.email,
+        sqlite_where=users.c.email.isnot(None),
+    )
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    cache_dir = tmp_path / 'cache'
+    c = make_corrector(*sqlite_urls, catalog_cache=CatalogCache(cache_dir))
+
+    first = c.diff()
+    assert sorted(p.suffix for p in cache_dir.iterdir()) == ['.json', '.json']
+    assert c.diff() == first
+    assert any(
+        op.kind == 'create_index' and 'WHERE' in op.sql for op in first
+    )
+
+
+def test_catalog_cache_misses_for_recreated_sqlite_file(
+    tmp_path,
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что пересозданный SQLite-файл не получает старый снимок."""
+    src_url, _ = sqlite_urls
+    cache = CatalogCache(tmp_path / 'cache')
+
+    def build(column_name):
+        engine = create_engine(src_url)
+        md = MetaData()
+        Table('users', md, Column(column_name, Integer, primary_key=True))
+        md.create_all(engine)
+        engine.dispose()
+
+    build('id')
+    first = make_corrector(*sqlite_urls, catalog_cache=cache)
+    assert 'id' in first._load_catalogs()[0].columns['users']
+    first.source_engine.dispose()
+
+    Path(make_url(src_url).database).unlink()
+    build('uid')
+    second = make_corrector(*sqlite_urls, catalog_cache=cache)
+    assert 'uid' in second._load_catalogs()[0].columns['users']
+    second.source_engine.dispose()
+
+
+def test_acquire_schema_lock_uses_schema_key_for_postgres(make_corrector):
+    """Проверяет advisory-блокировку схемы для PostgreSQL."""
+    c = make_corrector(schema='corr_lock')
+    c._target_dialect = 'postgresql'
+
+    conn = Mock()
+    c._acquire_schema_lock(conn)
+
+    conn.execute.assert_called_once()
+    stmt, params = conn.execute.call_args.args
+    assert 'pg_advisory_xact_lock' in stmt.text
+    assert params == {'prefix': 'correction_db:', 'schema': 'corr_lock'}
+
+
+def test_acquire_schema_lock_noop_for_sqlite(corrector):
+    """Проверяет, что для SQLite advisory-блокировка не берётся."""
+    conn = Mock()
+    corrector._acquire_schema_lock(conn)
+    conn.execute.assert_not_called()
+
+
+def test_inspectors_are_cached_until_cleared(corrector):
+    """Проверяет кэширование Inspector до clear_reflection_cache()."""
+    src_insp = corrector._src_inspector
+    tgt_insp = corrector._tgt_inspector
+
+    assert corrector._src_inspector is src_insp
+    assert corrector._inspector_for(corrector.source_engine) is src_insp
+    assert corrector._inspector_for(corrector.target_engine) is tgt_insp
+
+    src_insp.get_table_names()
+    assert src_insp.info_cache
+
+    corrector.clear_reflection_cache()
+
+    assert corrector._src_inspector is src_insp
+    assert corrector._tgt_inspector is tgt_insp
+    assert not src_insp.info_cache
+
+
+def test_load_catalog_uses_bulk_reflection(
+    monkeypatch,
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что каталог SQLite читается через get_multi_*."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table('users', md, Column('id', Integer, primary_key=True))
+    Table(
+        'orders',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', ForeignKey('users.id'), index=True),
+    )
+    md.create_all(src_engine)
+
+    c = make_corrector(*sqlite_urls)
+
+    def per_table(*args, **kwargs):
+        raise AssertionError('per-table reflection must not be used')
+
+    monkeypatch.setattr(c, '_reflect_catalog_per_table', per_table)
+
+    catalog = c._load_catalog(c.source_engine)
+
+    assert catalog.tables == frozenset({'users', 'orders'})
+    assert set(catalog.columns['orders']) == {'id', 'user_id'}
+    assert catalog.indexes['orders'][0]['column_names'] == ['user_id']
+    assert catalog.foreign_keys['orders'][0]['referred_table'] == 'users'
+
+    src_engine.dispose()
+
+
+def test_diff_compiles_each_column_type_once(
+    monkeypatch,
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что diff() компилирует тип каждой колонки один раз."""
+    src_url, tgt_url = sqlite_urls
+
+    for url, extra in ((src_url, True), (tgt_url, False)):
+        engine = create_engine(url)
+        md = MetaData()
+        cols = [
+            Column('id', Integer, primary_key=True),
+            Column('name', String),
+        ]
+        if extra:
+            cols.append(Column('age', Integer))
+        Table('users', md, *cols)
+        md.create_all(engine)
+        engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    compiled = []
+    columns_meta = c._columns_meta
+
+    def counting_columns_meta(cols, dialect):
+        compiled.extend(col['name'] for col in cols)
+        return columns_meta(cols, dialect)
+
+    monkeypatch.setattr(c, '_columns_meta', counting_columns_meta)
+
+    ops = c.diff()
+
+    assert any(op.kind == 'add_column' for op in ops)
+    assert sorted(compiled) == ['age', 'id', 'id', 'name', 'name']
+
+
+def test_diff_reflects_only_new_source_tables_in_one_batch(
+    monkeypatch,
+    sqlite_urls, make_corrector
+):
+    """Проверяет, что нужные таблицы source отражаются одним reflect()."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    for name in ('users', 'tags', 'notes'):
+        Table(
+            name,
+            md,
+            Column('id', Integer, primary_key=True),
+            Column('email', String(255), index=True),
+        )
+    md.create_all(src_engine)
+
+    tgt_engine = create_engine(tgt_url)
+    tgt_md = MetaData()
+    Table('notes', tgt_md, Column('id', Integer, primary_key=True),
+          Column('email', String(255), index=True))
+    Table('tags', tgt_md, Column('id', Integer, primary_key=True),
+          Column('email', String(255)))
+    tgt_md.create_all(tgt_engine)
+
+    c = make_corrector(*sqlite_urls)
+
+    batches = []
+    real_reflect = MetaData.reflect
+
+    def counting_reflect(self, *args, only=None, **kwargs):
+        batches.append(sorted(only))
+        return real_reflect(self, *args, only=only, **kwargs)
+
+    monkeypatch.setattr(MetaData, 'reflect', counting_reflect)
+
+    ops = c.diff()
+
+    assert [op.kind for op in ops] == [
+        'create_table', 'create_index', 'create_index'
+    ]
+    # Индекс tags строится из снимка каталога, Table нужна только users.
+    assert batches == [['users']]
+
+    src_engine.dispose()
+    tgt_engine.dispose()
+
+
+def test_plan_column_changes_returns_all_groups(corrector):
+    """Проверяет add_column, EXTRA и RISKY за один проход по колонкам."""
+    src_cols = {
+        'id': {'type_sql': 'INTEGER', 'nullable': False, 'default': None},
+        'email': {'type_sql': 'TEXT', 'nullable': False, 'default': None},
+        'age': {'type_sql': 'INTEGER', 'nullable': True, 'default': None},
+    }
+    tgt_cols = {
+        'id': {'type_sql': 'BIGINT', 'nullable': False, 'default': None},
+        'email': {'type_sql': 'TEXT', 'nullable': True, 'default': None},
+        'legacy': {'type_sql': 'TEXT', 'nullable': True, 'default': None},
+    }
+
+    add_ops, extra, risky = corrector._plan_column_changes(
+        'users',
+        src_cols,
+        tgt_cols,
+    )
+
+    assert [op.comment for op in add_ops] == ['Add column users.age']
+    assert add_ops[0].sql == 'ALTER TABLE "users" ADD COLUMN "age" INTEGER;'
+    assert [op.comment for op in extra] == [
+        'EXTRA: column exists only in target: users.legacy'
+    ]
+    assert [op.comment.split(':')[1].strip() for op in risky] == [
+        'type mismatch users.id',
+        'nullable mismatch users.email',
+    ]
+
+
+def test_qt_qualifies_table_with_schema(make_corrector):
+    """Проверяет квотирование имени таблицы со схемой и без неё."""
+    assert make_corrector()._qt('users') == '"users"'
+    assert make_corrector(schema='app')._qt('users') == '"app"."users"'
+
+
+def test_apply_runs_create_index_outside_batches(monkeypatch, corrector):
+    """Проверяет, что create_index разрывает батч и идёт отдельно."""
+    batches = []
+    monkeypatch.setattr(
+        corrector,
+        '_execute_batch',
+        lambda conn, statements: batches.append(list(statements)),
+    )
+
+    ops = [
+        Operation(kind='add_column', sql='A;', comment='a'),
+        Operation(kind='add_column', sql='B;', comment='b'),
+        Operation(kind='create_index', sql='I;', comment='i'),
+        Operation(kind='report', sql='-- no-op', comment='r'),
+        Operation(kind='add_column', sql='C;', comment='c'),
+    ]
+    corrector.apply(ops, dry_run=False)
+
+    assert [b for b in batches if b] == [['A;', 'B;'], ['I;'], ['C;']]
+
+
+def test_plan_add_missing_foreign_keys_skips_existing_fks(
+    monkeypatch,
+    postgres_dialect_corrector
+):
+    """Проверяет, что при совпадающих FK операции не строятся."""
+    c = postgres_dialect_corrector
+    fks = [{
+        'name': 'fk_orders_user',
+        'constrained_columns': ['user_id'],
+        'referred_table': 'users',
+        'referred_columns': ['id'],
+        'options': {'ondelete': 'CASCADE'},
+    }]
+
+    def fail_build(*args, **kwargs):
+        raise AssertionError('no FK operation expected')
+
+    monkeypatch.setattr(c, '_build_fk_operation', fail_build)
+
+    assert c._plan_add_missing_foreign_keys('orders', fks, list(fks)) == []
+
+
+def test_src_table_shares_metadata_between_tables(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что новые таблицы отражаются в одну общую MetaData."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table('users', md, Column('id', Integer, primary_key=True))
+    Table(
+        'orders',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', ForeignKey('users.id')),
+    )
+    md.create_all(src_engine)
+
+    c = make_corrector(*sqlite_urls)
+    assert c._src_md is None
+
+    orders = c._src_table('orders')
+    shared = c._src_md
+    c._src_table('users')
+
+    assert c._src_table('orders') is orders
+
+    assert c._src_md is shared
+    assert set(shared.tables) == {'users', 'orders'}
+
+    c.clear_reflection_cache()
+    assert c._src_md is None
+
+    src_engine.dispose()
+
+
+def test_engines_use_pool_options_and_autocommit_source(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет настройки пула и AUTOCOMMIT для source."""
+    c = make_corrector(*sqlite_urls)
+
+    assert c.source_engine.get_execution_options()['isolation_level'] == (
+        'AUTOCOMMIT'
+    )
+    assert 'isolation_level' not in c.target_engine.get_execution_options()
+    assert c.target_engine.pool.size() == 2
+    assert c.target_engine.pool._max_overflow == 10
+    assert c.target_engine.pool._pre_ping is True
+
+
+def test_pool_options_for_in_memory_sqlite_drops_pool_sizing():
+    """Проверяет, что для SQLite в памяти не передаются размеры пула."""
+    options = {
+        'pool_size': 2,
+        'max_overflow': 0,
+        'pool_pre_ping': True,
+        'pool_recycle': -1,
+    }
+
+    assert corrector_mod._pool_options_for('sqlite://', options) == {
+        'pool_pre_ping': True,
+        'pool_recycle': -1,
+    }
+    assert corrector_mod._pool_options_for(
+        'postgresql://u@h/db',
+        options,
+    ) == options
+
+    c = SchemaCorrector(source_url='sqlite://', target_url='sqlite://')
+    assert c.diff() == []
+
+
+@pytest.mark.parametrize(
+    ('format_type', 'collation', 'expected'),
+    [
+        ('character varying(255)', None, 'VARCHAR(255)'),
+        ('numeric(10,2)', None, 'NUMERIC(10, 2)'),
+        (
+            'timestamp(3) with time zone',
+            None,
+            'TIMESTAMP(3) WITH TIME ZONE',
+        ),
+        ('integer[]', None, 'INTEGER[]'),
+        ('character varying(20)[]', None, 'VARCHAR(20)[]'),
+        ('interval day to second', None, 'INTERVAL day to second'),
+        ('text', 'C', 'TEXT COLLATE "C"'),
+        ('mood', None, 'mood'),
+    ],
+)
+def test_pg_type_sql_matches_compiled_type(
+    format_type,
+    collation,
+    expected
+):
+    """Проверяет разбор format_type() без живого PostgreSQL.
+
+    _pg_type_sql() опирается на внутренние помощники PGDialect; тест
+    ловит их изменение при обновлении SQLAlchemy.
+    """
+    assert corrector_mod._pg_type_sql(
+        postgresql.dialect(),
+        format_type,
+        collation,
+    ) == expected
+
+
+def test_plan_foreign_keys_adds_validation_for_postgres(
+    postgres_dialect_corrector
+):
+    """Проверяет VALIDATE CONSTRAINT после NOT VALID FK в PostgreSQL."""
+    fk = {
+        'name': 'fk_orders_user',
+        'constrained_columns': ['user_id'],
+        'referred_table': 'users',
+        'referred_columns': ['id'],
+    }
+
+    ops = postgres_dialect_corrector._plan_add_missing_foreign_keys(
+        'orders',
+        [fk],
+        [],
+    )
+
+    assert [op.kind for op in ops] == [
+        'add_foreign_key',
+        'validate_foreign_key',
+    ]
+    assert ops[0].sql.endswith('NOT VALID;')
+    assert ops[1].sql == (
+        'ALTER TABLE "orders" VALIDATE CONSTRAINT "fk_orders_user";'
+    )
+
+
+def test_apply_validates_foreign_keys_in_second_transaction(
+    monkeypatch,
+    corrector
+):
+    """Проверяет, что validate_foreign_key идёт после основной транзакции."""
+    batches = []
+    monkeypatch.setattr(
+        corrector,
+        '_execute_batch',
+        lambda conn, statements: batches.append(list(statements)),
+    )
+
+    ops = [
+        Operation(kind='add_foreign_key', sql='F1;', comment='f1'),
+        Operation(kind='validate_foreign_key', sql='V1;', comment='v1'),
+        Operation(kind='add_foreign_key', sql='F2;', comment='f2'),
+        Operation(kind='validate_foreign_key', sql='V2;', comment='v2'),
+    ]
+    corrector.apply(ops, dry_run=False)
+
+    assert [b for b in batches if b] == [['F1;', 'F2;'], ['V1;', 'V2;']]
+
+
+def test_iter_diff_streams_into_apply(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что iter_diff() ленивый и его можно передать в apply()."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table(
+        'users',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('email', String(255), index=True),
+    )
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    stream = c.iter_diff()
+    assert not isinstance(stream, list)
+    assert list(c.iter_diff()) == c.diff()
+
+    c.apply(stream, dry_run=False)
+
+    assert c.diff() == []
+
+
+def test_apply_iter_diff_on_single_connection_pool(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет apply(iter_diff()) на файловом QueuePool из одного соединения.
+
+    Планирование читает target через пул; если бы apply() держал
+    соединение в транзакции, пока поток ещё планирует, второе соединение
+    ждало бы до pool_timeout.
+    """
+    src_url, _ = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table(
+        'users',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('email', String(255), index=True),
+    )
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    c = make_corrector(
+        *sqlite_urls,
+        engine_factory=lambda url, **options: create_engine(
+            url,
+            pool_timeout=2,
+            **options,
+        ),
+        pool_size=1,
+        max_overflow=0,
+    )
+    assert type(c.target_engine.pool).__name__ == 'QueuePool'
+
+    c.apply(c.iter_diff(), dry_run=False)
+
+    assert c.diff() == []
+
+
+def test_context_manager_apply_iter_diff_keeps_transaction(sqlite_urls):
+    """Проверяет apply(iter_diff()) внутри with на файловых БД.
+
+    Чтения каталога идут через закреплённое соединение; они не должны
+    откатывать транзакцию, которую apply() открыл на нём же.
+    """
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table('users', md, Column('id', Integer, primary_key=True))
+    Table(
+        'orders',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id')),
+    )
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    with SchemaCorrector(source_url=src_url, target_url=tgt_url) as c:
+        c.apply(c.iter_diff(), dry_run=False)
+        assert c.diff() == []
+
+    tgt_engine = create_engine(tgt_url)
+    try:
+        assert set(inspect(tgt_engine).get_table_names()) == {
+            'orders',
+            'users',
+        }
+    finally:
+        tgt_engine.dispose()
+
+
+def test_pinned_read_keeps_caller_transaction(sqlite_urls):
+    """Проверяет, что чтение не откатывает транзакцию вызывающего кода."""
+    src_url, tgt_url = sqlite_urls
+
+    with SchemaCorrector(source_url=src_url, target_url=tgt_url) as c:
+        with c._connect(c.target_engine) as conn, conn.begin():
+            conn.exec_driver_sql('CREATE TABLE kept (id INTEGER)')
+            c.diff()
+            assert conn.in_transaction()
+
+        c.diff()
+        assert not c._tgt_conn.in_transaction()
+
+    tgt_engine = create_engine(tgt_url)
+    try:
+        assert inspect(tgt_engine).get_table_names() == ['kept']
+    finally:
+        tgt_engine.dispose()
+
+
+def test_partition_names_splits_in_one_pass():
+    """Проверяет разбиение имён на missing/extra/common (отсортированные)."""
+    missing, extra, common = corrector_mod._partition_names(
+        {'users', 'orders', 'audit', 'tags'},
+        frozenset({'users', 'notes', 'tags', 'zz_old'}),
+    )
+
+    assert missing == ['audit', 'orders']
+    assert extra == ['notes', 'zz_old']
+    assert common == ['tags', 'users']
+
+    assert corrector_mod._partition_names([], ['a']) == ([], ['a'], [])
+
+
+def test_per_table_fallback_reads_columns_once_per_side(
+    monkeypatch,
+    sqlite_urls, make_corrector
+):
+    """Проверяет, что без bulk-reflection колонки читаются один раз."""
+    src_url, tgt_url = sqlite_urls
+
+    for url, extra in ((src_url, 'age'), (tgt_url, 'legacy')):
+        engine = create_engine(url)
+        md = MetaData()
+        Table(
+            'users',
+            md,
+            Column('id', Integer, primary_key=True),
+            Column('email', String(255)),
+            Column(extra, Integer),
+        )
+        md.create_all(engine)
+        engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    def no_bulk(*args, **kwargs):
+        raise NotImplementedError
+
+    monkeypatch.setattr(c, '_reflect_catalog_bulk', no_bulk)
+
+    reads = []
+    get_columns = Inspector.get_columns
+
+    def counting_get_columns(self, table_name, *args, **kwargs):
+        reads.append(table_name)
+        return get_columns(self, table_name, *args, **kwargs)
+
+    monkeypatch.setattr(Inspector, 'get_columns', counting_get_columns)
+
+    ops = c.diff()
+
+    assert any(op.comment == 'Add column users.age' for op in ops)
+    assert any('users.legacy' in op.comment for op in ops)
+    assert reads == ['users', 'users']
+
+
+def test_diff_skips_column_comparison_for_identical_tables(
+    monkeypatch,
+    sqlite_urls, make_corrector
+):
+    """Проверяет, что таблицы с одинаковыми колонками не разбираются."""
+    src_url, tgt_url = sqlite_urls
+
+    for url in (src_url, tgt_url):
+        engine = create_engine(url)
+        md = MetaData()
+        Table('users', md, Column('id', Integer, primary_key=True))
+        Table(
+            'orders',
+            md,
+            Column('id', Integer, primary_key=True),
+            Column('total', Integer if url == src_url else String(20)),
+        )
+        md.create_all(engine)
+        engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    compared = []
+    plan_column_changes = c._plan_column_changes
+
+    def counting_plan_column_changes(table_name, *args):
+        compared.append(table_name)
+        return plan_column_changes(table_name, *args)
+
+    monkeypatch.setattr(
+        c,
+        '_plan_column_changes',
+        counting_plan_column_changes,
+    )
+
+    ops = c.diff()
+
+    assert compared == ['orders']
+    assert any('type mismatch orders.total' in op.comment for op in ops)
+
+
+def test_apply_logs_progress_with_total_for_streamed_plan(caplog, corrector):
+    """Проверяет, что поток операций собирается и прогресс идёт с total."""
+    ops = [
+        Operation(
+            kind='create_table',
+            sql=f'CREATE TABLE t{n} (id INTEGER PRIMARY KEY);',
+            comment=f'Create t{n}',
+        )
+        for n in range(2)
+    ]
+
+    caplog.set_level('INFO')
+    corrector.apply(ops[:1], dry_run=False)
+    corrector.apply(iter(ops[1:]), dry_run=False)
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert 'Executing op 1/1: create_table (Create t0)' in messages
+    assert 'Executing op 1/1: create_table (Create t1)' in messages
+    assert messages.count('Apply finished successfully. ops=1') == 2
+
+
+def test_schema_fingerprint_is_postgres_only(monkeypatch, corrector):
+    """Проверяет, что без отпечатка diff() идёт обычным путём."""
+    assert corrector._schema_fingerprint(corrector.source_engine) is None
+    assert corrector._schemas_fingerprint_equal() is False
+
+    monkeypatch.setattr(corrector, '_load_catalogs', Mock(
+        side_effect=AssertionError('catalogs must not be loaded'),
+    ))
+    monkeypatch.setattr(
+        corrector,
+        '_schemas_fingerprint_equal',
+        lambda: True,
+    )
+    assert corrector.diff() == []
+
+    corrector.fast_equal_skip = False
+    with pytest.raises(AssertionError):
+        corrector.diff()
+
+
+def test_context_manager_pins_one_connection_per_engine(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что внутри with diff()+apply() не берут новые соединения."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    Table(
+        'users',
+        md,
+        Column('id', Integer, primary_key=True),
+        Column('email', String(255), index=True),
+    )
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    checkouts = []
+    for engine in (c.source_engine, c.target_engine):
+        event.listen(
+            engine.pool,
+            'checkout',
+            lambda *args, url=engine.url: checkouts.append(url.database),
+        )
+
+    with c as pinned:
+        assert pinned is c
+        c.apply(c.diff(), dry_run=False)
+        assert c.diff() == []
+
+    assert sorted(checkouts) == sorted([
+        c.source_engine.url.database,
+        c.target_engine.url.database,
+    ])
+    assert c._src_conn is None and c._tgt_conn is None
+
+    assert c.diff() == []
+
+
+def test_table_filters_apply_before_reflection(monkeypatch, sqlite_urls):
+    """Проверяет include_tables/exclude_tables до чтения колонок."""
+    src_url, tgt_url = sqlite_urls
+
+    src_engine = create_engine(src_url)
+    md = MetaData()
+    for name in ('users', 'orders', 'audit_log'):
+        Table(name, md, Column('id', Integer, primary_key=True))
+    md.create_all(src_engine)
+    src_engine.dispose()
+
+    c = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        include_tables=['users', 'orders', 'audit_log'],
+        exclude_tables={'audit_log'},
+    )
+
+    requested = []
+    get_multi_columns = Inspector.get_multi_columns
+
+    def recording_get_multi_columns(self, *args, **kwargs):
+        requested.append(sorted(kwargs.get('filter_names') or []))
+        return get_multi_columns(self, *args, **kwargs)
+
+    monkeypatch.setattr(
+        Inspector,
+        'get_multi_columns',
+        recording_get_multi_columns,
+    )
+
+    ops = c.diff()
+
+    assert [op.comment for op in ops] == [
+        'Create table orders',
+        'Create table users',
+    ]
+    # target пуст: get_multi_* для него не вызывается вовсе.
+    assert requested[0] == ['orders', 'users']
+    assert c._filter_token() == (
+        "|include=['audit_log', 'orders', 'users']|exclude=['audit_log']"
+    )
+
+    only_users = SchemaCorrector(
+        source_url=src_url,
+        target_url=tgt_url,
+        include_tables=['users'],
+    )
+    assert [op.comment for op in only_users.diff()] == ['Create table users']
+
+
+def test_diff_plans_columns_and_indexes_per_table(
+    sqlite_urls,
+    make_corrector
+):
+    """Проверяет, что колонки и индексы общей таблицы идут подряд."""
+    src_url, tgt_url = sqlite_urls
+
+    for url in (src_url, tgt_url):
+        engine = create_engine(url)
+        md = MetaData()
+        for name in ('orders', 'users'):
+            cols = [Column('id', Integer, primary_key=True)]
+            if url == src_url:
+                cols.append(Column('code', String(20), index=True))
+            Table(name, md, *cols)
+        md.create_all(engine)
+        engine.dispose()
+
+    c = make_corrector(*sqlite_urls)
+
+    assert [op.comment for op in c.diff()] == [
+        'Add column orders.code',
+        'Create index ix_orders_code',
+        'Add column users.code',
+        'Create index ix_users_code',
+    ]
+
+
+def test_operation_uses_slots():
+    """Проверяет, что Operation без __dict__ и остаётся неизменяемой."""
+    op = Operation(kind='report', sql='-- no-op', comment='x')
+
+    assert not hasattr(op, '__dict__')
+    with pytest.raises(AttributeError):
+        op.kind = 'add_column'
+    assert op == Operation(kind='report', sql='-- no-op', comment='x')
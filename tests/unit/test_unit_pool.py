@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+import pool
+from corrector import SchemaCorrector
+
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture()
+def clean_pool():
+    """Гарантирует пустой кэш Engine до и после теста."""
+    pool.dispose_all()
+    yield
+    pool.dispose_all()
+
+
+def test_get_engine_reuses_engine_per_url_and_options(clean_pool, tmp_path):
+    """Проверяет, что get_engine отдаёт один Engine на (url, options)."""
+    url = f'sqlite:///{tmp_path / "p.db"}'
+
+    first = pool.get_engine(url)
+    assert pool.get_engine(url) is first
+    assert pool.get_engine(url, pool_size=3) is not first
+
+
+def test_dispose_all_clears_cache(clean_pool, tmp_path):
+    """Проверяет, что dispose_all() сбрасывает кэш Engine."""
+    url = f'sqlite:///{tmp_path / "p.db"}'
+    first = pool.get_engine(url)
+
+    pool.dispose_all()
+
+    assert pool.get_engine(url) is not first
+
+
+def test_corrector_uses_engine_factory(clean_pool, tmp_path):
+    """Проверяет, что SchemaCorrector берёт Engine из engine_factory."""
+    src = f'sqlite:///{tmp_path / "s.db"}'
+    tgt = f'sqlite:///{tmp_path / "t.db"}'
+
+    c1 = SchemaCorrector(src, tgt, engine_factory=pool.get_engine)
+    c2 = SchemaCorrector(src, tgt, engine_factory=pool.get_engine)
+
+    assert c1.source_engine.pool is c2.source_engine.pool
+    assert c1.target_engine is c2.target_engine